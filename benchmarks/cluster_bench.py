@@ -0,0 +1,114 @@
+# benchmarks/cluster_bench.py
+"""
+Title clustering benchmark: the old linear max(token_set_ratio) scan against
+utils.title_cluster.TitleClusterer on a synthetic library.
+
+    python benchmarks/cluster_bench.py --files 20000 --series 2000
+
+The library mixes a few thousand series/movie titles with the usual noise
+(season tags, years, spelling variants, casing). Both implementations are run
+on the same titles and the resulting groups are checked to be identical.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thefuzz import fuzz
+from utils.title_cluster import TitleClusterer
+
+WORDS = (
+    "the of a and in to dark night knight house dragon game thrones stranger things money heist "
+    "breaking bad family man sacred games mirzapur panchayat kota factory loki wednesday witcher "
+    "crown boys office friends lost dark matter silo severance ozark narcos vikings peaky blinders "
+    "squid last us mandalorian andor hawkeye moon knight echo reacher jack ryan bosch lupin elite "
+    "money love story hero zero city kingdom return rise fall legend war king queen prince empire "
+    "secret island river mountain shadow fire ice blood gold silver iron steel storm"
+).split()
+
+
+def make_library(files: int, series: int, seed: int):
+    rng = random.Random(seed)
+    bases = []
+    for _ in range(series):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+        if rng.random() < 0.3:
+            title += f" {rng.randint(1990, 2025)}"
+        bases.append(title)
+
+    titles = []
+    for _ in range(files):
+        title = rng.choice(bases)
+        roll = rng.random()
+        if roll < 0.15:
+            title += f" S{rng.randint(1, 9):02d}"
+        elif roll < 0.25:
+            title = title.lower()
+        elif roll < 0.3 and len(title) > 6:
+            i = rng.randrange(len(title))
+            title = title[:i] + rng.choice("aeiou") + title[i + 1:]
+        titles.append(title)
+    return titles
+
+
+def linear_groups(titles, threshold: int):
+    groups = {}
+    for title in titles:
+        best = max(groups.keys(), key=lambda k: fuzz.token_set_ratio(title, k), default=None)
+        if best and fuzz.token_set_ratio(title, best) > threshold:
+            groups[best].append(title)
+        else:
+            groups[title] = [title]
+    return groups
+
+
+def clustered_groups(titles, threshold: int):
+    groups = {}
+    clusterer = TitleClusterer(threshold)
+    for title in titles:
+        best = clusterer.match(title)
+        if best is not None:
+            groups[best].append(title)
+        else:
+            groups[title] = [title]
+            clusterer.add(title)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--series", type=int, default=2000)
+    parser.add_argument("--threshold", type=int, default=85)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-linear", action="store_true", help="only time the clusterer")
+    args = parser.parse_args()
+
+    titles = make_library(args.files, args.series, args.seed)
+
+    started = time.perf_counter()
+    clustered = clustered_groups(titles, args.threshold)
+    clustered_time = time.perf_counter() - started
+    print(f"{len(titles)} titles -> {len(clustered)} groups")
+    print(f"TitleClusterer: {clustered_time:.2f}s")
+
+    if args.skip_linear:
+        return
+    started = time.perf_counter()
+    linear = linear_groups(titles, args.threshold)
+    linear_time = time.perf_counter() - started
+    print(f"linear scan:    {linear_time:.2f}s")
+    print(f"speedup:        {linear_time / clustered_time:.1f}x")
+
+    identical = linear == clustered and list(linear) == list(clustered)
+    print(f"groups identical: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
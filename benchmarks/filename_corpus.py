@@ -0,0 +1,122 @@
+# benchmarks/filename_corpus.py
+"""
+Generator of realistic release filenames for the parser benchmarks.
+
+The names follow the shapes seen in Index DB channels: dotted scene releases,
+spaced Telegram uploads, site prefixes, @channel tags, bracketed language
+lists and the many ways season/episode ranges are written.
+"""
+
+import random
+
+TITLES = [
+    "Mirzapur", "Panchayat", "Kota Factory", "Sacred Games", "The Family Man", "Farzi", "Paatal Lok",
+    "Scam 1992", "Aspirants", "Gullak", "Asur", "Breathe Into The Shadows", "Made In Heaven",
+    "Money Heist", "Stranger Things", "The Boys", "Loki", "Wednesday", "The Witcher", "Squid Game",
+    "The Last of Us", "House of the Dragon", "Breaking Bad", "Peaky Blinders", "Dark", "Narcos",
+    "Jawan", "Pathaan", "Leo", "Jailer", "Vikram", "Kantara", "Pushpa The Rise", "RRR", "KGF Chapter 2",
+    "Animal", "Dunki", "Salaar", "Oppenheimer", "Barbie", "John Wick Chapter 4", "Dune Part Two",
+    "The Dark Knight", "Inception", "Interstellar", "Avengers Endgame", "Spider-Man No Way Home",
+    "Guardians of the Galaxy Vol 3", "Fast X", "Mission Impossible Dead Reckoning",
+    "Manjummel Boys", "Premalu", "Aavesham", "Bramayugam", "2018", "Drishyam 2", "Vikram Vedha",
+    "Ponniyin Selvan Part One", "Jai Bhim", "Soorarai Pottru", "Master", "Beast", "Varisu", "Thunivu",
+]
+YEARS = list(range(1995, 2026))
+RESOLUTIONS = ["480p", "540p", "720p", "1080p", "2160p", "4K"]
+SOURCES = ["WEB-DL", "WEBRip", "HDRip", "BluRay", "HDTV", "DVDRip", "PreDVD", "HDCAM", "NF WEB-DL", "AMZN WEB-DL", "DSNP WEB-DL", "ZEE5 WEB-DL"]
+CODECS = ["x264", "x265", "HEVC", "H264", "AVC", "10bit HEVC"]
+AUDIO = ["AAC", "DD5.1", "DDP5.1", "AAC2.0", "DD+5.1 - 640Kbps", "Atmos", "ESubs", "MSubs"]
+LANGUAGES = ["Hindi", "English", "Tamil", "Telugu", "Malayalam", "Kannada", "Punjabi", "Japanese", "Korean", "Hin", "Eng", "Tam", "Tel", "Mal", "Kan"]
+AUDIO_TAGS = ["Dual Audio", "Multi Audio", "ORG", "HQ", "Dubbed", "UNCUT", "REPACK", "PROPER", "Clean Audio"]
+SITES = ["www.1TamilMV.world", "www.TamilBlasters.xyz", "moviesmod.org", "www.7HitMovies.com", "hdhub4u.tv", "vegamovies.nl"]
+CHANNELS = ["@MoviesHub", "@Cinema_Club", "@TeamHDT", "@StreamLinks_4K", "@bollyflix", "@Series_World"]
+EXTENSIONS = ["mkv", "mkv", "mkv", "mp4", "mp4", "avi", "webm"]
+GROUPS = ["PSA", "YTS", "RARBG", "Pahe", "Tigole", "DIDAR", "StarBoy", "JC", "BWT", "TheMoviesBoss"]
+
+
+def _episode_range(rng, season: int):
+    start = rng.randint(1, 8)
+    end = start + rng.randint(1, 9)
+    shapes = [
+        f"S{season:02d}E{start:02d}-E{end:02d}",
+        f"S{season:02d} E{start:02d}-E{end:02d}",
+        f"S{season:02d} EP({start:02d}-{end:02d})",
+        f"S{season:02d} [E{start:02d}-E{end:02d}]",
+        f"S{season:02d} [{start:02d} To {end:02d} Eps]",
+        f"S{season:02d} [EP {start:02d} to {end:02d}]",
+        f"S{season:02d} [Epi {start:02d}-{end:02d}]",
+        f"S{season:02d} Ep{start:02d}-{end:02d}",
+        f"Episode {start} to {end}",
+        f"Ep {start:02d} - {end:02d}",
+        f"E{start:02d}-{end:02d}",
+        f"{start:02d} To {end:02d}",
+        f"Ep.[{start}-{end}]",
+        # Descending and equal ranges, which the parser must not accept.
+        f"S{season:02d} EP({end:02d}-{start:02d})",
+        f"Ep {start:02d} - {start:02d}",
+    ]
+    return rng.choice(shapes)
+
+
+def _languages(rng):
+    languages = rng.sample(LANGUAGES, rng.randint(1, 4))
+    shape = rng.random()
+    if shape < 0.35:
+        return "[" + " + ".join(languages) + "]"
+    if shape < 0.55:
+        return "(" + "-".join(languages) + ")"
+    if shape < 0.75:
+        return " ".join(languages)
+    return rng.choice(AUDIO_TAGS) + " " + " ".join(languages)
+
+
+def make_filename(rng) -> str:
+    title = rng.choice(TITLES)
+    if rng.random() < 0.1:
+        title = title.lower()
+    parts = [title]
+
+    kind = rng.random()
+    if kind < 0.35:
+        # Single episode.
+        season, episode = rng.randint(1, 5), rng.randint(1, 24)
+        parts.append(rng.choice([f"S{season:02d}E{episode:02d}", f"S{season}E{episode}", f"S{season:02d} E{episode:02d}", f"S{season:02d} EP{episode:02d}", f"Season {season} Episode {episode}"]))
+    elif kind < 0.6:
+        parts.append(_episode_range(rng, rng.randint(1, 5)))
+    elif kind < 0.7:
+        parts.append(rng.choice([f"Season {rng.randint(1, 5)} Complete", f"S{rng.randint(1, 5):02d} Complete", f"S{rng.randint(1, 5):02d}"]))
+    if kind >= 0.6 or rng.random() < 0.4:
+        year = rng.choice(YEARS)
+        parts.append(f"({year})" if rng.random() < 0.5 else str(year))
+
+    if rng.random() < 0.7:
+        parts.append(_languages(rng))
+    parts.append(rng.choice(RESOLUTIONS))
+    parts.append(rng.choice(SOURCES))
+    if rng.random() < 0.8:
+        parts.append(rng.choice(CODECS))
+    if rng.random() < 0.5:
+        parts.append(rng.choice(AUDIO))
+    if rng.random() < 0.3:
+        parts.append(f"- {rng.choice([350, 450, 700, 900])}MB" if rng.random() < 0.5 else f"{rng.choice([1.2, 1.4, 2.5, 4.7])}GB")
+    if rng.random() < 0.3:
+        parts.append(rng.choice(GROUPS))
+
+    separator = rng.choice([".", ".", " ", " ", "_"])
+    name = separator.join(part.replace(" ", separator) if separator != " " else part for part in parts)
+
+    roll = rng.random()
+    if roll < 0.15:
+        name = f"{rng.choice(SITES)} - {name}"
+    elif roll < 0.35:
+        name = f"{rng.choice(CHANNELS)} {name}"
+    elif roll < 0.45:
+        name = f"{name} {rng.choice(CHANNELS)}"
+    elif roll < 0.5:
+        name = f"[{rng.choice(CHANNELS)}] {name}"
+    return f"{name}.{rng.choice(EXTENSIONS)}"
+
+
+def make_filenames(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [make_filename(rng) for _ in range(count)]
@@ -0,0 +1,196 @@
+# benchmarks/parser_bench.py
+"""
+Filename parser microbenchmark: the previous parse_filename_offline, which
+built its patterns on every call, against the precompiled one in
+utils.filename_parser.
+
+    python benchmarks/parser_bench.py --files 5000
+
+Two timings are reported for each implementation:
+- full: the whole parse, PTN included;
+- own stages: PTN.parse replaced by a lookup of results computed beforehand,
+  which leaves only the regex, range and language work done by the parser itself.
+Outputs of both implementations are compared for every filename.
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PTN
+from benchmarks.filename_corpus import make_filenames
+from utils.filename_parser import LANGUAGE_MAP, parse_filename_offline
+
+
+def legacy_parse_filename_offline(name: str) -> dict:
+    """The parser as it was before the patterns were precompiled."""
+    original_name = name
+
+    name_for_parsing = name.replace('_', ' ').replace('.', ' ')
+    name_for_parsing = re.sub(r'(?:www\.)?[\w-]+\.(?:com|org|net|xyz|me|io|in|cc|biz|world|info|club|mobi|press|top|site|tech|online|store|live|co|shop|fun|tamilmv)\b', '', name_for_parsing, flags=re.IGNORECASE)
+    name_for_parsing = re.sub(r'@[a-zA-Z0-9_]+', '', name_for_parsing).strip()
+
+
+    season_info_str = ""
+    episode_info_str = ""
+    raw_episode_text_to_remove = ""
+
+    search_name_for_eps = name.replace('_', '.').replace(' ', '.')
+    
+    range_patterns = [
+        (r'(\d{1,2})\s+(?:To|-|–|—)\s+(\d{1,2})', 'no_season'),
+        (r'(\d{1,2})\s+(\d{1,2})(?=\s\d{4})', 'no_season'),
+        (r'S(\d{1,2}).*?EP\((\d{1,4})-(\d{1,4})\)', 'season'),
+        (r'S(\d{1,2}).*?\[E?(\d{1,4})\s*-\s*E?(\d{1,4})\]', 'season'),
+        (r'S(\d{1,2}).*?\[(\d{1,4})\s*To\s*(\d{1,4})\s*Eps?\]', 'season'),
+        (r'S(\d{1,2}).*?\[EP\s*(\d{1,4})\s*to\s*(\d{1,4})\]', 'season'),
+        (r'S(\d{1,2}).*?\[Epi\s*(\d{1,4})\s*-\s*(\d{1,4})\]', 'season'),
+        (r'S(\d{1,2}).*?Ep\.?(\d{1,4})-(\d{1,4})', 'season'),
+        (r'S(\d{1,2})\s*E(\d{1,4})[-\s]*E(\d{1,4})', 'season'),
+        (r'\.Ep\.\[(\d{1,4})-(\d{1,4})\]', 'no_season'),
+        (r'Ep\s*(\d{1,4})\s*-\s*(\d{1,4})', 'no_season'),
+        (r'(?:E|Episode)s?\.?\s?(\d{1,4})\s?(?:to|-|–|—)\s?(\d{1,4})', 'no_season'),
+    ]
+
+    for pattern, p_type in range_patterns:
+        match = re.search(pattern, name_for_parsing, re.IGNORECASE)
+        if match:
+            groups = match.groups()
+            raw_episode_text_to_remove = match.group(0)
+            if p_type == 'season':
+                if not season_info_str: season_info_str = f"S{int(groups[0]):02d}"
+                start_ep, end_ep = groups[1], groups[2]
+            else:
+                start_ep, end_ep = groups[0], groups[1]
+
+            if int(start_ep) < int(end_ep):
+                episode_info_str = f"E{int(start_ep):02d}-E{int(end_ep):02d}"
+                name_for_parsing = name_for_parsing.replace(raw_episode_text_to_remove, ' ', 1)
+                break 
+
+    name_for_ptn = re.sub(r'\[.*?\]', '', name_for_parsing).strip()
+    parsed_info = PTN.parse(name_for_ptn)
+    
+    initial_title = parsed_info.get('title', '').strip()
+    if not season_info_str and parsed_info.get('season'):
+        season_info_str = f"S{parsed_info.get('season'):02d}"
+    if not episode_info_str and parsed_info.get('episode'):
+        episode = parsed_info.get('episode')
+        if isinstance(episode, list):
+            if len(episode) > 1: episode_info_str = f"E{min(episode):02d}-E{max(episode):02d}"
+            elif episode: episode_info_str = f"E{episode[0]:02d}"
+        else: episode_info_str = f"E{episode:02d}"
+    
+    year_from_filename = parsed_info.get('year')
+    
+    # --- DECREED MODIFICATION: START ---
+    # Hybrid language detection using PTN's output and our custom map.
+    found_languages = set()
+    search_string_lower = name.lower()
+    
+    # Also check PTN's audio tag for languages
+    ptn_audio_tags = parsed_info.get('audio', '')
+    if isinstance(ptn_audio_tags, list):
+        ptn_audio_tags = " ".join(ptn_audio_tags)
+    
+    search_string_lower += " " + ptn_audio_tags.lower()
+    
+    for key, value in LANGUAGE_MAP.items():
+        if re.search(r'\b' + key + r'\b', search_string_lower):
+            found_languages.add(value)
+    # --- DECREED MODIFICATION: END ---
+
+    title_to_clean = initial_title
+    if year_from_filename:
+        title_to_clean = re.sub(r'\b' + str(year_from_filename) + r'\b', '', title_to_clean)
+    
+    if raw_episode_text_to_remove:
+        title_to_clean = title_to_clean.replace(raw_episode_text_to_remove, '')
+        
+    title_to_clean = re.sub(r'\bS\d{1,2}\b|\bE\d{1,4}\b', '', title_to_clean, flags=re.IGNORECASE)
+    
+    junk_words = [
+        'Ep', 'Eps', 'Episode', 'Episodes', 'Season', 'Series', 'South', 'Dubbed', 'Completed',
+        'Web', r'\d+Kbps', 'UNCUT', 'ORG', 'HQ', 'ESubs', 'MSubs', 'REMASTERED', 'REPACK',
+        'PROPER', 'iNTERNAL', 'Sample', 'Video', 'Dual', 'Audio', 'Multi', 'Hollywood',
+        'New', 'Combined', 'Complete', 'Chapter', 'PSA', 'JC', 'DIDAR', 'StarBoy',
+        'Hindi', 'English', 'Tamil', 'Telugu', 'Kannada', 'Malayalam', 'Punjabi', 'Japanese', 'Korean',
+        'NF', 'AMZN', 'MAX', 'DSNP', 'ZEE5', 'WEB-DL', 'HDRip', 'WEBRip', 'HEVC', 'x265', 'x264', 'AAC',
+        '1tamilmv', 'www'
+    ]
+    junk_pattern_re = r'\b(' + r'|'.join(junk_words) + r')\b'
+    cleaned_title = re.sub(junk_pattern_re, '', title_to_clean, flags=re.IGNORECASE)
+    cleaned_title = re.sub(r'[-_.]', ' ', cleaned_title)
+    cleaned_title = re.sub(r'^[^\w\s]+', '', cleaned_title)
+    cleaned_title = re.sub(r'\s+', ' ', cleaned_title).strip()
+    
+    if not cleaned_title: cleaned_title = " ".join(original_name.split('.')[:-1])
+
+    return {
+        "cleaned_title": cleaned_title,
+        "year": year_from_filename,
+        "season_info": season_info_str,
+        "episode_info": episode_info_str,
+        "languages": sorted(list(found_languages)),
+        "quality_tags": " | ".join(filter(None, [parsed_info.get('resolution'), parsed_info.get('quality'), parsed_info.get('codec')]))
+    }
+
+
+def time_parser(parse, names, rounds: int) -> float:
+    """Best per-file time in microseconds over `rounds` passes."""
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for name in names:
+            parse(name)
+        best = min(best, time.perf_counter() - started)
+    return best / len(names) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    names = make_filenames(args.files, args.seed)
+
+    mismatches = [name for name in names if legacy_parse_filename_offline(name) != parse_filename_offline(name)]
+    print(f"{len(names)} filenames, {len(mismatches)} output mismatches")
+    for name in mismatches[:10]:
+        print(f"  mismatch: {name}")
+
+    legacy_full = time_parser(legacy_parse_filename_offline, names, args.rounds)
+    new_full = time_parser(parse_filename_offline, names, args.rounds)
+
+    real_ptn_parse = PTN.parse
+    ptn_results = {}
+
+    def recorded_ptn_parse(name):
+        if name not in ptn_results:
+            ptn_results[name] = real_ptn_parse(name)
+        return dict(ptn_results[name])
+
+    PTN.parse = recorded_ptn_parse
+    try:
+        for name in names:
+            parse_filename_offline(name)
+        legacy_own = time_parser(legacy_parse_filename_offline, names, args.rounds)
+        new_own = time_parser(parse_filename_offline, names, args.rounds)
+    finally:
+        PTN.parse = real_ptn_parse
+
+    print(f"{'':12}{'previous':>12}{'precompiled':>14}{'speedup':>10}")
+    print(f"{'full':12}{legacy_full:>10.1f}us{new_full:>12.1f}us{legacy_full / new_full:>9.1f}x")
+    print(f"{'own stages':12}{legacy_own:>10.1f}us{new_own:>12.1f}us{legacy_own / new_own:>9.1f}x")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
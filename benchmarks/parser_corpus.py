@@ -0,0 +1,198 @@
+# benchmarks/parser_corpus.py
+"""
+Regression and performance harness for the filename parser.
+
+benchmarks/data/filename_corpus.jsonl holds several thousand release names
+with the golden output of clean_and_parse_filename, simple_clean_filename and
+natural_sort_key for each. The IMDb step is stubbed to "no match", so the
+golden parse is the filename-only result.
+
+    python benchmarks/parser_corpus.py              # check parity, report latency
+    python benchmarks/parser_corpus.py --update     # rewrite the golden outputs
+
+Any parser change must either keep every golden output or come with an
+--update whose diff is reviewed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils.helpers as helpers
+from benchmarks.filename_corpus import make_filenames
+from utils.filename_parser import parse_filename_offline
+
+CORPUS_PATH = os.path.join(ROOT, "benchmarks", "data", "filename_corpus.jsonl")
+CORPUS_SIZE = 4000
+CORPUS_SEED = 17
+
+# Shapes the generator doesn't produce, taken from real Index DB channels.
+HANDPICKED = [
+    "www.1TamilMV.world - Leo (2023) Tamil HQ HDRip - 1080p - x264 - (DD+5.1 - 640Kbps & AAC) - 2.5GB - ESub.mkv",
+    "[@Cinema_Club] Jawan.2023.Hindi.1080p.NF.WEB-DL.DDP5.1.Atmos.H264-PSA.mkv",
+    "Mirzapur S02 [E01-E10] Hin+Eng 720p AMZN WEB-DL @MoviesHub.mkv",
+    "Panchayat.S03.EP(01-08).1080p.WEB-DL.Hindi.x264.mkv",
+    "Farzi S01 [01 To 08 Eps] Hindi 480p.mkv",
+    "Kota Factory S02 [EP 01 to 05] 720p.mkv",
+    "Aspirants S02 [Epi 01-05] 1080p HEVC.mkv",
+    "The Boys S04E01E02 1080p AMZN WEB-DL.mkv",
+    "Asur Episode 1 to 8 Hindi.mp4",
+    "Gullak Ep 01 - 05 SonyLiv.mp4",
+    "Scam 1992 01 02 2020 720p.mkv",
+    "Loki.S02.Ep.[1-6].2160p.DSNP.mkv",
+    "Dark S01 EP(08-01) 720p.mkv",
+    "Stranger_Things_S04_E01_E09_1080p_NF.mkv",
+    "Breaking.Bad.S01-S05.Complete.1080p.BluRay.x265.mkv",
+    "Money Heist S05 Vol 2 Dual Audio [Hindi+English] 720p.mkv",
+    "Vikram (2022) [Tamil + Telugu + Hindi + Malayalam + Kannada] 1080p.mkv",
+    "KGF Chapter 2 (2022) Multi Audio 4K HDR.mkv",
+    "RRR 2022 Jap Kor Chi Fre Ger Spa Ita Rus Ara Tur Ind 720p.mkv",
+    "Premalu.2024.Malayalam.ORG.HDRip.x264.ESubs.mkv",
+    "2018 (2023) Malayalam 1080p.mkv",
+    "1917.2019.1080p.BluRay.mkv",
+    "Drishyam 2 (2022) Hindi UNCUT REPACK PROPER iNTERNAL 1080p.mkv",
+    "@bollyflix_Animal_2023_Hindi_HQ_PreDVDRip_x264_AAC.mkv",
+    "moviesmod.org - Dunki (2023) Hindi WEB-DL 480p.mp4",
+    "Salaar.Part.1.Ceasefire.2023.Telugu.1080p.mkv",
+    "Oppenheimer.2023.IMAX.2160p.UHD.BluRay.x265.10bit.HDR.DTS-HD.MA.5.1.mkv",
+    "Spider-Man.No.Way.Home.2021.1080p.WEBRip.mkv",
+    "Kantara (2022) Kannada HQ HDRip 720p x264 AAC 1.4GB.mkv",
+    "the.family.man.s02e09.720p.web.h264.mkv",
+    "House of the Dragon S02 E01 - E08 2160p.mkv",
+    "Paatal Lok S01 E01–E09 Hindi.mkv",
+    "Sacred Games S02 Episodes 01—08 Hindi.mkv",
+    "Made In Heaven S02 E01 to E07.mkv",
+    "Pushpa.The.Rise.2021.Hindi.Dubbed.South.Movie.mkv",
+    "Manjummel Boys (2024) Malayalam [Mal + Tam + Tel] WEB-DL 1080p.mkv",
+    "Aavesham 2024 Malayalam 1080p AMZN WEB-DL DDP5 1 H 264-DIDAR.mkv",
+    "Wednesday.S01.COMPLETE.720p.NF.WEBRip.x264-GalaxyTV.mkv",
+    "Squid.Game.S02.Korean.Dual.Audio.1080p.mkv",
+    "No Extension At All",
+    "....mkv",
+    "S01E01.mkv",
+    "@OnlyAChannelTag.mp4",
+    "[Hindi] [720p].mkv",
+    "Ponniyin Selvan Part One (2022) [Tamil] 1080p.mkv",
+    "Jai Bhim 2021 Tamil HQ Real HDRip 720p x264 [Tam+Tel+Hin+Mal+Kan].mkv",
+    "Vikram Vedha 2022 Hindi 1080p NF WEB-DL DDP5.1 Atmos x264-StarBoy.mkv",
+    "Master.2021.Tamil.Proper.720p.HDRip.x264.1.4GB.mkv",
+    "Beast (2022) Tamil Complete Combined New Chapter 720p.mkv",
+    "Thunivu (2023) Tamil 480p — 450MB.mkv",
+]
+
+
+def load_corpus(path: str = CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def _no_imdb_match(title):
+    return None, None
+
+
+def stub_imdb():
+    helpers.get_definitive_title_from_imdb = _no_imdb_match
+
+
+def golden_record(name: str) -> dict:
+    return {
+        "name": name,
+        "parsed": asyncio.run(_parse_inline(name)),
+        "simple_clean": helpers.simple_clean_filename(name),
+        "sort_key": helpers.natural_sort_key(name),
+    }
+
+
+async def _parse_inline(name: str):
+    """clean_and_parse_filename without the process pool hop."""
+    return await helpers._complete_parsed_info(parse_filename_offline(name))
+
+
+def normalize(value):
+    # JSON has no tuples; compare what the golden file can hold.
+    return json.loads(json.dumps(value))
+
+
+def write_corpus(path: str):
+    names = HANDPICKED + make_filenames(CORPUS_SIZE - len(HANDPICKED), CORPUS_SEED)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for name in names:
+            f.write(json.dumps(golden_record(name), ensure_ascii=False) + "\n")
+    print(f"Wrote {len(names)} golden records to {os.path.relpath(path, ROOT)}")
+
+
+def check_parity(records):
+    failures = []
+    for record in records:
+        current = normalize(golden_record(record["name"]))
+        for field in ("parsed", "simple_clean", "sort_key"):
+            if current[field] != record[field]:
+                failures.append((record["name"], field, record[field], current[field]))
+    return failures
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def measure(names, rounds: int):
+    # Per-file latency of the parse itself, on this process.
+    latencies = []
+    for _ in range(rounds):
+        for name in names:
+            started = time.perf_counter()
+            await _parse_inline(name)
+            latencies.append(time.perf_counter() - started)
+
+    # Throughput of the path the bot uses: chunks through the parser pool.
+    await helpers.parse_filenames(names[:64])  # spawn the pool outside the timing
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await helpers.parse_filenames(names)
+    pool_seconds = (time.perf_counter() - started) / rounds
+    helpers.shutdown_parser_pool()
+    return latencies, pool_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="regenerate the golden outputs")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    args = parser.parse_args()
+
+    stub_imdb()
+    if args.update:
+        write_corpus(args.corpus)
+        return
+
+    records = load_corpus(args.corpus)
+    failures = check_parity(records)
+    print(f"{len(records)} filenames, {len(failures)} golden mismatches")
+    for name, field, expected, got in failures[:20]:
+        print(f"  {field} of {name!r}\n    expected: {expected}\n    got:      {got}")
+
+    names = [record["name"] for record in records]
+    latencies, pool_seconds = asyncio.run(measure(names, args.rounds))
+    print(
+        f"inline parse: p50 {percentile(latencies, 0.50) * 1e6:.0f}us, "
+        f"p99 {percentile(latencies, 0.99) * 1e6:.0f}us, "
+        f"mean {statistics.fmean(latencies) * 1e6:.0f}us, "
+        f"{len(latencies) / sum(latencies):.0f} files/s"
+    )
+    print(f"parse_filenames (pool): {len(names) / pool_seconds:.0f} files/s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
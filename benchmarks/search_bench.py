@@ -0,0 +1,62 @@
+# benchmarks/search_bench.py
+"""
+"Search Your Files" benchmark: query latency of utils.file_search on one
+owner's library of generated release names.
+
+    python benchmarks/search_bench.py --files 100000
+
+Reports the time to build the index from names (the tokens are stored with
+each file, so a real build skips the tokenizing but adds the MongoDB read),
+then the cold latency of each query (ranking included, the result cache
+cleared) and the latency of a repeated query, which is what a page turn costs.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.filename_corpus import make_filenames
+from utils.file_search import FileSearchIndex, search_tokens
+
+QUERIES = [
+    "mirzapur", "the boys 1080", "stranger things s04", "hindi 720p web", "2023",
+    "s01", "1080p", "mkv", "m", "spider-man no way home", "no such title",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    names = make_filenames(args.files, args.seed)
+    started = time.perf_counter()
+    index = FileSearchIndex()
+    for number, name in enumerate(names):
+        index.add(number, str(number), name, search_tokens(name))
+    print(f"built an index of {len(index)} files in {time.perf_counter() - started:.2f}s")
+
+    print(f"{'query':26}{'matches':>9}{'cold':>10}{'cached':>10}")
+    worst = 0.0
+    for query in QUERIES:
+        cold = float("inf")
+        for _ in range(args.rounds):
+            index.results.clear()
+            started = time.perf_counter()
+            ranked = index.search(query)
+            cold = min(cold, time.perf_counter() - started)
+        started = time.perf_counter()
+        index.search(query)
+        cached = time.perf_counter() - started
+        worst = max(worst, cold)
+        print(f"{query!r:26}{len(ranked):>9}{cold * 1000:>8.1f}ms{cached * 1000:>8.2f}ms")
+    print(f"slowest cold query: {worst * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# benchmarks/stream_bench.py
+"""
+Streaming benchmark against a fake Telegram DC.
+
+Runs the real aiohttp stream routes and ByteStreamer, but upload.GetFile and
+get_messages are answered by in-process fakes with configurable latency, so
+the numbers reflect our own pipeline (prefetching, range mapping, the chunk
+cache, the client pool) rather than Telegram.
+
+    python benchmarks/stream_bench.py --clients 32 --size-mb 64 --latency-ms 80
+    python benchmarks/stream_bench.py --seek-ratio 0.5 --cache-mb 512
+
+Reports time-to-first-byte, MB/s per stream, aggregate MB/s and RSS. The HTTP
+clients run in the same process as the server, so RSS includes them too.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web, ClientSession, TCPConnector
+from pyrogram import raw
+from pyrogram.file_id import FileId, FileType
+from server.stream_routes import routes
+from util.chunk_cache import ChunkCache
+from util.client_pool import StreamClientPool
+
+MiB = 1024 * 1024
+
+
+class FakeDC:
+    """Answers GetFile from an in-memory blob after `latency` (+ up to `jitter`) seconds."""
+
+    def __init__(self, data: bytes, latency: float, jitter: float):
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+
+    async def invoke(self, query, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        return raw.types.upload.File(
+            type=raw.types.storage.FilePartial(), mtime=0,
+            bytes=self.data[query.offset:query.offset + query.limit]
+        )
+
+
+class FakeSessionManager:
+    def __init__(self, dc: FakeDC):
+        self.dc = dc
+
+    @asynccontextmanager
+    async def session(self, dc_id: int):
+        yield self.dc
+
+
+class FakeBot:
+    """Carries the attributes the stream routes read from the real Bot."""
+
+    def __init__(self, dc: FakeDC, file_size: int, cache: ChunkCache, props_latency: float):
+        self.name = "bench"
+        self.app_url = "http://bench"
+        self.owner_db_channel = -100
+        self.stream_channel_id = None
+        self.chunk_cache = cache
+        self.media_session_manager = FakeSessionManager(dc)
+        self.stream_pool = StreamClientPool(self)
+        self.props_latency = props_latency
+        file_id = FileId(file_type=FileType.DOCUMENT, dc_id=2, media_id=1, access_hash=1, file_reference=b"").encode()
+        self.document = types.SimpleNamespace(
+            file_id=file_id, file_unique_id="BENCHFILE", file_size=file_size,
+            mime_type="video/mp4", file_name="bench.mp4"
+        )
+
+    async def get_messages(self, chat_id, message_ids):
+        await asyncio.sleep(self.props_latency)
+        return types.SimpleNamespace(media=True, document=self.document)
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_client(session, url: str, data: bytes, seek_ratio: float, results: list):
+    file_size = len(data)
+    start = 0
+    headers = {}
+    if random.random() < seek_ratio:
+        start = random.randrange(0, file_size)
+        headers["Range"] = f"bytes={start}-"
+    expected_body = memoryview(data)[start:]
+    started = time.perf_counter()
+    ttfb = None
+    received = 0
+    async with session.get(url, headers=headers) as response:
+        async for chunk in response.content.iter_any():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            # Every byte is checked against the source blob, so a range-mapping or
+            # cache-offset bug fails the run instead of only skewing the numbers.
+            if expected_body[received:received + len(chunk)] != chunk:
+                raise RuntimeError(f"Wrong bytes at offset {start + received} of {headers.get('Range', 'the full file')}")
+            received += len(chunk)
+        expected = int(response.headers["Content-Length"])
+    elapsed = time.perf_counter() - started
+    if received != expected or expected != file_size - start:
+        raise RuntimeError(f"Short read: got {received} of {expected} bytes ({file_size - start} requested)")
+    results.append((ttfb or elapsed, received, elapsed))
+
+
+async def sample_rss(samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        samples.append(rss_mb())
+        await asyncio.sleep(0.2)
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def bench(args):
+    random.seed(args.seed)
+    file_size = int(args.size_mb * MiB)
+    data = random.randbytes(file_size)
+    dc = FakeDC(data, args.latency_ms / 1000, args.jitter_ms / 1000)
+
+    cache_dir = tempfile.mkdtemp(prefix="stream_bench_")
+    cache = ChunkCache(cache_dir, args.cache_mb * MiB)
+    bot = FakeBot(dc, file_size, cache, args.props_latency_ms / 1000)
+
+    app = web.Application()
+    app["bot"] = bot
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}/stream/1"
+
+    rss_samples, stop = [rss_mb()], asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(rss_samples, stop))
+    results = []
+    try:
+        async with ClientSession(connector=TCPConnector(limit=0)) as session:
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                round_results = []
+                await asyncio.gather(*[
+                    run_client(session, url, data, args.seek_ratio, round_results)
+                    for _ in range(args.clients)
+                ])
+                wall = time.perf_counter() - started
+                results.append((wall, round_results))
+    finally:
+        stop.set()
+        await sampler
+        await runner.cleanup()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"clients={args.clients} size={args.size_mb}MiB latency={args.latency_ms}ms jitter={args.jitter_ms}ms "
+          f"seek_ratio={args.seek_ratio} cache={args.cache_mb}MiB")
+    for i, (wall, round_results) in enumerate(results, start=1):
+        ttfbs = [r[0] * 1000 for r in round_results]
+        rates = [r[1] / MiB / r[2] for r in round_results if r[2] > 0]
+        total = sum(r[1] for r in round_results) / MiB
+        print(f"round {i}: ttfb p50={percentile(ttfbs, 50):.1f}ms p95={percentile(ttfbs, 95):.1f}ms | "
+              f"per-stream p50={statistics.median(rates):.1f}MB/s min={min(rates):.1f}MB/s | "
+              f"aggregate={total / wall:.1f}MB/s ({total:.0f}MiB in {wall:.2f}s)")
+    print(f"GetFile calls={dc.calls} | RSS start={rss_samples[0]:.0f}MiB peak={max(rss_samples):.0f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent streams per round")
+    parser.add_argument("--rounds", type=int, default=2, help="repeat the load this many times (later rounds hit the cache)")
+    parser.add_argument("--size-mb", type=float, default=32, help="size of the fake file")
+    parser.add_argument("--latency-ms", type=float, default=50, help="GetFile latency per part")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="extra random GetFile latency per part")
+    parser.add_argument("--props-latency-ms", type=float, default=100, help="get_messages latency")
+    parser.add_argument("--seek-ratio", type=float, default=0.3, help="share of requests that start at a random offset")
+    parser.add_argument("--cache-mb", type=int, default=0, help="chunk cache size (0 disables it)")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import time
 import re
 import os
 import sys
+import multiprocessing
+from functools import partial
 from datetime import datetime, time as dt_time, timedelta, UTC
 from pyrogram.enums import ParseMode
 from pyrogram.errors import (
@@ -18,10 +20,21 @@ from config import Config
 from database.db import (
     get_user, save_file_data, get_post_channel, get_index_db_channel,
     save_post, get_users_with_daily_notify_enabled, get_stats_for_owner,
-    get_monthly_record, update_monthly_record
+    get_monthly_record, update_monthly_record, get_media_dcs, add_media_dc,
+    update_ingest_job, mark_ingest_jobs_posted, get_unposted_ingest_jobs,
+    ensure_indexes, report_slow_queries, watch_user_changes
 )
-from utils.helpers import create_post, clean_and_parse_filename, notify_and_remove_invalid_channel
-from thefuzz import fuzz
+from utils.helpers import create_post, parse_filenames, shutdown_parser_pool, notify_and_remove_invalid_channel
+from features.poster import send_poster, POSTER_MEDIA_ERRORS
+from util.chunk_cache import ChunkCache
+from util.http import close_session as close_http_session
+from util.media_sessions import MediaSessionManager
+from util.client_pool import StreamClientPool
+from server.worker import run_stream_worker
+from util.rate_limiter import RateLimiter, method_class
+from util.ingest_queue import IngestQueue
+from util.metrics import FLOOD_WAITS, FLOOD_WAIT_SECONDS, BATCH_FINALIZE_SECONDS, monitor_event_loop_lag
+from utils.title_cluster import TitleClusterer
 from collections import defaultdict
 
 # Setup logging
@@ -39,23 +52,27 @@ class Bot(Client):
         self.me = None
         self.web_app = None
         self.web_runner = None
+        self.metrics_runner = None
+        self.stream_workers = []
 
         self.owner_db_channel = Config.OWNER_DB_CHANNEL
         self.stream_channel_id = None
+        # With STREAM_WORKERS the worker processes own the chunk cache, not the bot.
+        cache_bytes = 0 if Config.STREAM_WORKERS > 0 else Config.CHUNK_CACHE_MAX_MB * 1024 * 1024
+        self.chunk_cache = ChunkCache(Config.CHUNK_CACHE_DIR, cache_bytes)
+        self.media_session_manager = MediaSessionManager(self, on_new_dc=add_media_dc)
+        self.stream_pool = StreamClientPool(self)
         
         self.open_batches = {} 
         self.processing_users = set() 
         self.waiting_files = {} 
         self.user_batch_locks = defaultdict(asyncio.Lock)
+        self.ingest_queue = IngestQueue(self)
 
         # Caches
         self.search_cache = {}
         self.last_dashboard_edit_time = {}
-        self.imdb_cache = {}
-        self.is_in_flood_wait = asyncio.Event()
-        self.is_in_flood_wait.set()
-        self.flood_wait_duration = 0
-        self.shortener_fail_cache = {}
+        self.rate_limiter = RateLimiter(storage_chat_ids=[self.owner_db_channel])
 
         # --- DECREED MODIFICATION: Use APP_URL ---
         self.app_url = Config.APP_URL.rstrip('/')
@@ -68,28 +85,34 @@ class Bot(Client):
         self.last_health_check_status = True
         self.last_health_check_error = "" 
 
+    @staticmethod
+    def _rate_limit_target(coro, args, kwargs):
+        """Works out the chat a call talks to and its method class, for the rate limiter."""
+        chat_id = kwargs.get('chat_id')
+        if chat_id is None and args and isinstance(args[0], int):
+            chat_id = args[0]  # e.g. message.copy(chat_id)
+        if chat_id is None:
+            # Bound Message methods such as dashboard_msg.edit_text act on the message's chat.
+            chat = getattr(getattr(coro, '__self__', None), 'chat', None)
+            chat_id = getattr(chat, 'id', None)
+        return chat_id, method_class(getattr(coro, '__name__', ''))
+
     async def execute_with_retry(self, coro, *args, **kwargs):
         retries = 7
         base_delay = 5
+        chat_id, method = self._rate_limit_target(coro, args, kwargs)
         for i in range(retries):
             try:
-                await self.is_in_flood_wait.wait()
+                await self.rate_limiter.acquire(chat_id, method)
                 await self.is_healthy.wait()
-                return await coro(*args, **kwargs)
+                result = await coro(*args, **kwargs)
+                self.rate_limiter.report_success(chat_id, method)
+                return result
             except FloodWait as e:
-                logger.warning(f"FloodWait of {e.value}s detected. Engaging global pause.")
-                self.is_in_flood_wait.clear()
-                self.flood_wait_duration = e.value + 10
-                
-                if self.is_in_flood_wait.is_set():
-                    try:
-                        await self.send_message(Config.ADMIN_ID, f"🚨 **FloodWait Triggered!**\n\nI will pause all outgoing actions for `{self.flood_wait_duration}` seconds.")
-                    except Exception as admin_notify_err:
-                        logger.error(f"Failed to notify admin about FloodWait: {admin_notify_err}")
-
-                await asyncio.sleep(self.flood_wait_duration)
-                self.is_in_flood_wait.set()
-                logger.info("Global pause finished. Resuming operations.")
+                # Only the chat (or method class) that was throttled backs off; everything else keeps flowing.
+                FLOOD_WAITS.inc(source="bot_api")
+                FLOOD_WAIT_SECONDS.observe(e.value)
+                self.rate_limiter.report_flood_wait(chat_id, method, e.value)
                 continue
             except (asyncio.TimeoutError, PeerIdInvalid, ChannelInvalid, ChatForwardsRestricted) as e:
                 delay = base_delay * (2 ** i)
@@ -98,6 +121,9 @@ class Bot(Client):
             except MessageNotModified:
                 logger.warning("Attempted to edit message with the same content. Skipping.")
                 return None
+            except POSTER_MEDIA_ERRORS:
+                # Telegram rejected the photo, not the bot; the caller decides what to send instead.
+                raise
             except UserIsBlocked:
                 logger.warning(f"Action failed because user has blocked the bot. Aborting this action.")
                 raise
@@ -173,8 +199,9 @@ class Bot(Client):
             return
 
         self.processing_users.add(user_id)
-        self.imdb_cache.clear()
         dashboard_msg = None
+        messages = []
+        started = time.perf_counter()
         try:
             if user_id not in self.open_batches: return
             collection_data = self.open_batches.pop(user_id)
@@ -190,27 +217,30 @@ class Bot(Client):
                 status = f"🔬 **Status:** Analyzing & grouping `{len(messages)}` files..."
                 await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
 
-            tasks = [clean_and_parse_filename(getattr(msg, msg.media.value).file_name, self.imdb_cache) for msg in messages]
-            file_infos = await asyncio.gather(*tasks)
+            file_infos = await parse_filenames([getattr(msg, msg.media.value).file_name for msg in messages])
 
             logical_batches = {}
             SIMILARITY_THRESHOLD = 85
+            clusterer = TitleClusterer(SIMILARITY_THRESHOLD)
             for i, info in enumerate(file_infos):
                 if not info or not info.get("batch_title"): continue
                 current_msg = messages[i]
                 current_title = info["batch_title"]
-                best_match_key = max(logical_batches.keys(), key=lambda k: fuzz.token_set_ratio(current_title, k), default=None)
-                if best_match_key and fuzz.token_set_ratio(current_title, best_match_key) > SIMILARITY_THRESHOLD:
+                best_match_key = clusterer.match(current_title)
+                if best_match_key is not None:
                     logical_batches[best_match_key].append(current_msg)
-                else: logical_batches[current_title] = [current_msg]
+                else:
+                    logical_batches[current_title] = [current_msg]
+                    clusterer.add(current_title)
 
             total_batches = len(logical_batches)
             if dashboard_msg:
                 status = f"✅ **Status:** Found `{total_batches}` logical series/batches. Processing..."
                 await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
 
+            # The owner's settings are read once for the whole batch.
             user = await get_user(user_id)
-            post_channel_id = await get_post_channel(user_id) if user else None
+            post_channel_id = (user.get('post_channels') or [None])[0] if user else None
             if not post_channel_id or not await notify_and_remove_invalid_channel(self, user_id, post_channel_id, "Post"):
                 if dashboard_msg: await self.execute_with_retry(dashboard_msg.edit_text, "❌ **Error!** Could not access a valid Post Channel. Please set one in settings.")
                 return
@@ -220,17 +250,18 @@ class Bot(Client):
                     status = f"🚀 **Status:** Posting batch {i + 1}/{total_batches} ('{batch_title}')..."
                     await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
 
-                posts_to_send = await create_post(self, user_id, batch_messages, self.imdb_cache)
+                posts_to_send = await create_post(self, user_id, batch_messages, user)
                 if not posts_to_send:
                     logger.warning(f"No posts generated for batch '{batch_title}' for user {user_id}.")
                     await self.send_message(user_id, f"⚠️ **Skipped Batch:** No valid posts could be generated for '{batch_title}'.")
+                    await mark_ingest_jobs_posted(user_id, [m.id for m in batch_messages])
                     continue
 
                 for poster, caption, footer in posts_to_send:
                     sent_message = None
                     try:
                         if poster:
-                            sent_message = await self.execute_with_retry(self.send_photo, chat_id=post_channel_id, photo=poster, caption=caption, reply_markup=footer)
+                            sent_message = await send_poster(partial(self.execute_with_retry, self.send_photo), poster, chat_id=post_channel_id, caption=caption, reply_markup=footer)
                         else:
                             sent_message = await self.execute_with_retry(self.send_message, chat_id=post_channel_id, text=caption, reply_markup=footer, disable_web_page_preview=True)
                         if sent_message:
@@ -241,7 +272,8 @@ class Bot(Client):
                         logger.error(f"Failed to send post for user {user_id}: {e}")
                         await self.send_message(user_id, "❌ **Posting Error!**\nFailed to send a file to your Auto Post Channel. Please check bot permissions and try again.")
                         continue
-                    await asyncio.sleep(2.5)
+                # The batch is out; a restart from here on must not post it again.
+                await mark_ingest_jobs_posted(user_id, [m.id for m in batch_messages])
 
             if dashboard_msg: await self.execute_with_retry(dashboard_msg.delete)
             await self.send_message(user_id, "✅ **Batch processing complete!** All files have been successfully posted.")
@@ -254,15 +286,42 @@ class Bot(Client):
                 try: await self.execute_with_retry(dashboard_msg.edit_text, f"❌ **Error!** An unexpected error occurred: {e}")
                 except UserIsBlocked: pass
         finally:
+            BATCH_FINALIZE_SECONDS.observe(time.perf_counter() - started)
+            # Handled failures close the batch too; only a crash leaves it to be recovered on startup.
+            if messages:
+                try: await mark_ingest_jobs_posted(user_id, [m.id for m in messages])
+                except Exception as e: logger.error(f"Could not close ingest jobs for user {user_id}: {e}")
             self.processing_users.discard(user_id)
             self.last_dashboard_edit_time.pop(user_id, None)
             if user_id in self.waiting_files and self.waiting_files[user_id]:
                 await self._start_new_collection(user_id, self.waiting_files.pop(user_id))
     
-    async def process_new_file(self, message, user_id):
+    async def _recover_unposted_files(self):
+        """Rebuilds the batches of files that were copied and saved but never posted before the last shutdown."""
+        jobs = await get_unposted_ingest_jobs()
+        message_ids_by_owner = defaultdict(list)
+        for job in jobs:
+            message_ids_by_owner[job['owner_id']].append(job['copied_message_id'])
+
+        for user_id, message_ids in message_ids_by_owner.items():
+            messages = []
+            for i in range(0, len(message_ids), 200):
+                fetched = await self.get_messages(self.owner_db_channel, message_ids[i:i + 200])
+                messages.extend(m for m in fetched if m and not m.empty and m.media)
+            missing = set(message_ids) - {m.id for m in messages}
+            if missing:
+                await mark_ingest_jobs_posted(user_id, missing)
+            if not messages:
+                continue
+            async with self.user_batch_locks[user_id]:
+                await self._start_new_collection(user_id, messages[:BATCH_SIZE_LIMIT])
+                if len(messages) > BATCH_SIZE_LIMIT:
+                    self.waiting_files.setdefault(user_id, []).extend(messages[BATCH_SIZE_LIMIT:])
+            logger.info(f"Recovered {len(messages)} unposted file(s) for user {user_id}.")
+
+    async def process_new_file(self, message, user_id, job_id=None):
         async with self.user_batch_locks[user_id]:
             try:
-                await self.is_in_flood_wait.wait()
                 await self.is_healthy.wait()
 
                 media = getattr(message, message.media.value, None)
@@ -270,11 +329,13 @@ class Bot(Client):
                     logger.info(f"Skipping short duration file '{media.file_name}' for user {user_id}.")
                     if user_id in self.open_batches:
                         self.open_batches[user_id].setdefault('skipped_files', []).append(media.file_name)
+                    if job_id: await update_ingest_job(job_id, 'skipped')
                     return
 
                 self.stream_channel_id = await get_index_db_channel(user_id) or self.owner_db_channel
                 if not self.stream_channel_id:
                     logger.error(f"User {user_id} has no Index/Owner DB channel. Skipping file '{media.file_name}'.")
+                    if job_id: await update_ingest_job(job_id, 'failed', error="no DB channel")
                     return
 
                 copied_message = await self.execute_with_retry(message.copy, self.owner_db_channel)
@@ -282,10 +343,12 @@ class Bot(Client):
                 if not copied_message:
                     logger.critical(f"FATAL: message.copy returned None for user {user_id} on file '{media.file_name}'.")
                     await self.send_message(Config.ADMIN_ID, f"**Failed to copy file for user `{user_id}`.**\nFile: `{media.file_name}`\nThis happened after all retries. The file has been skipped.")
+                    if job_id: await update_ingest_job(job_id, 'failed', error="copy failed")
                     return
 
                 logger.info(f"File '{media.file_name}' copied to Owner DB. New message ID: {copied_message.id}")
                 await save_file_data(user_id, message, copied_message, copied_message)
+                if job_id: await update_ingest_job(job_id, 'copied', copied_message_id=copied_message.id)
 
                 if user_id in self.processing_users:
                     self.waiting_files.setdefault(user_id, []).append(copied_message)
@@ -318,6 +381,9 @@ class Bot(Client):
 
             except Exception as e:
                 logger.exception(f"CRITICAL ERROR processing file '{getattr(message.media, 'file_name', 'N/A')}' for user {user_id}: {e}")
+                if job_id:
+                    try: await update_ingest_job(job_id, 'failed', error=str(e))
+                    except Exception as db_err: logger.error(f"Could not mark ingest job {job_id} as failed: {db_err}")
                 try:
                     await self.send_message(Config.ADMIN_ID, f"**File Processing Error**\n\nAn error occurred while handling a file for user `{user_id}`.\n\n**File:** `{getattr(message.media, 'file_name', 'N/A')}`\n**Error:** `{e}`")
                 except Exception as admin_notify_err:
@@ -341,6 +407,45 @@ class Bot(Client):
         await site.start()
         logger.info(f"Web server started successfully. Public URL: {self.app_url} (Bound to 0.0.0.0:{port})")
 
+    def _spawn_stream_worker(self, index: int, port: int):
+        ctx = multiprocessing.get_context("spawn")
+        process = ctx.Process(target=run_stream_worker, args=(index, port), name=f"stream-worker-{index}", daemon=True)
+        process.start()
+        return process
+
+    async def start_stream_workers(self):
+        # Same PORT convention as start_web_server; the workers share it via SO_REUSEPORT.
+        port = int(os.environ.get("PORT", 8080))
+        self.stream_workers = [self._spawn_stream_worker(i, port) for i in range(Config.STREAM_WORKERS)]
+        logger.info(f"Started {len(self.stream_workers)} stream worker process(es). Public URL: {self.app_url} (Bound to 0.0.0.0:{port})")
+        asyncio.create_task(self.stream_worker_monitor(port))
+
+    async def stream_worker_monitor(self, port: int):
+        while self.stream_workers:
+            await asyncio.sleep(30)
+            for i, process in enumerate(self.stream_workers):
+                if process.is_alive():
+                    continue
+                logger.error(f"Stream worker #{i} exited with code {process.exitcode}. Restarting it.")
+                self.stream_workers[i] = self._spawn_stream_worker(i, port)
+
+    async def start_metrics_server(self):
+        # In worker mode the bot has no web server of its own, so its metrics get a separate port.
+        from server.stream_routes import metrics_handler
+        app = web.Application()
+        app.router.add_get("/metrics", metrics_handler)
+        self.metrics_runner = web.AppRunner(app)
+        await self.metrics_runner.setup()
+        await web.TCPSite(self.metrics_runner, "0.0.0.0", Config.METRICS_PORT).start()
+        logger.info(f"Metrics server started on 0.0.0.0:{Config.METRICS_PORT}.")
+
+    async def stop_stream_workers(self):
+        workers, self.stream_workers = self.stream_workers, []
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            await asyncio.to_thread(process.join, 10)
+
 
     async def daily_restart_handler(self):
         while True:
@@ -490,8 +595,31 @@ class Bot(Client):
                 self.is_healthy.clear()
         else:
             logger.warning("Owner DB ID not set. Critical functionalities will fail.")
+
+        try:
+            await ensure_indexes()
+        except Exception as e:
+            logger.error(f"Could not create the MongoDB indexes: {e}")
+        try:
+            await self._recover_unposted_files()
+        except Exception as e:
+            logger.error(f"Could not recover unposted files from the ingest queue: {e}", exc_info=True)
+        await self.ingest_queue.start()
         
-        await self.start_web_server()
+        if Config.STREAM_WORKERS > 0:
+            # Streaming runs in its own processes; this one only handles updates.
+            await self.start_stream_workers()
+            if Config.METRICS_PORT:
+                await self.start_metrics_server()
+        else:
+            await self.stream_pool.start(Config.MULTI_BOT_TOKENS)
+            await self.start_web_server()
+            self.media_session_manager.start()
+            asyncio.create_task(self.media_session_manager.prewarm([await self.storage.dc_id(), *await get_media_dcs()]))
+        asyncio.create_task(monitor_event_loop_lag())
+        asyncio.create_task(watch_user_changes())
+        if Config.SLOW_QUERY_MS > 0:
+            asyncio.create_task(report_slow_queries())
         asyncio.create_task(self.daily_restart_handler())
         asyncio.create_task(self.connection_health_check())
         asyncio.create_task(self.daily_stats_notifier())
@@ -499,8 +627,15 @@ class Bot(Client):
 
     async def stop(self, *args):
         logger.info("Stopping bot...")
+        await self.ingest_queue.stop()
         if self.web_runner: await self.web_runner.cleanup()
-        await super.stop()
+        if self.metrics_runner: await self.metrics_runner.cleanup()
+        await self.stop_stream_workers()
+        await self.stream_pool.stop()
+        await self.media_session_manager.stop()
+        shutdown_parser_pool()
+        await close_http_session()
+        await super().stop()
         logger.info("Bot stopped.")
 
 if __name__ == "__main__":
@@ -34,3 +34,65 @@ class Config:
     # ================================================================= #
     # Yahan apna tutorial video ya channel ka link daalein
     TUTORIAL_URL = os.environ.get("TUTORIAL_URL", "https://t.me/mzbotz")
+
+    # --- Streaming tuning ---
+    # How many 1 MiB Telegram parts each stream fetches ahead of the client.
+    # Memory per stream stays bounded to roughly this many MiB.
+    STREAM_PREFETCH_PARTS = int(os.environ.get("STREAM_PREFETCH_PARTS", "4"))
+
+    # Media sessions kept open per Telegram DC, and how often (seconds) they are health-checked.
+    MEDIA_SESSIONS_PER_DC = int(os.environ.get("MEDIA_SESSIONS_PER_DC", "2"))
+    MEDIA_SESSION_KEEPALIVE = int(os.environ.get("MEDIA_SESSION_KEEPALIVE", "60"))
+
+    # Extra bot tokens used only to fetch file parts for streaming (space or comma separated).
+    # Every helper bot must be an admin in the Owner DB Channel.
+    MULTI_BOT_TOKENS = os.environ.get("MULTI_BOT_TOKENS", "").replace(",", " ").split()
+
+    # Local on-disk cache of streamed parts. Set CHUNK_CACHE_MAX_MB to 0 to disable it.
+    CHUNK_CACHE_DIR = os.environ.get("CHUNK_CACHE_DIR", "stream_cache")
+    CHUNK_CACHE_MAX_MB = int(os.environ.get("CHUNK_CACHE_MAX_MB", "2048"))
+
+    # Run the stream/download web server in this many separate processes sharing PORT
+    # (SO_REUSEPORT, Linux only). 0 keeps it inside the bot process.
+    # MULTI_BOT_TOKENS are split between the workers, one login per token. Workers beyond
+    # the number of helper tokens log in with BOT_TOKEN as well, each as one more session
+    # of the main bot next to the bot process, and FloodWaits are then learned per
+    # session rather than per token. Provide at least STREAM_WORKERS helper tokens to avoid it.
+    STREAM_WORKERS = int(os.environ.get("STREAM_WORKERS", "0"))
+
+    # --- File ingest ---
+    # Files from Index DB channels are processed by this many workers; the rest wait in MongoDB.
+    INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "4"))
+
+    # Processes used to parse filenames off the event loop. -1 picks min(4, CPU count);
+    # 0 parses in a thread instead.
+    PARSER_PROCESSES = int(os.environ.get("PARSER_PROCESSES", "-1"))
+
+    # User settings are cached for this many seconds. Writes through the bot invalidate
+    # at once; with a replica set, so do writes from other processes (change streams).
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "300"))
+
+    # Queries slower than this (milliseconds) get their plan checked; plans that scan a
+    # whole collection are logged and counted. 0 disables the check.
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", "100"))
+
+    # In-memory search indexes of an owner's files are rebuilt from MongoDB after this many seconds.
+    SEARCH_INDEX_TTL = int(os.environ.get("SEARCH_INDEX_TTL", "1800"))
+
+    # --- Outbound HTTP (posters, shorteners, URL checks) ---
+    # One keep-alive connection pool is shared by all requests. Timeouts are in seconds.
+    HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "10"))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+    # Poster lookups (IMDb/TMDB, per truncated query) run this many at a time.
+    POSTER_SEARCH_CONCURRENCY = int(os.environ.get("POSTER_SEARCH_CONCURRENCY", "4"))
+    # Links of one post are shortened this many at a time.
+    SHORTENER_CONCURRENCY = int(os.environ.get("SHORTENER_CONCURRENCY", "5"))
+
+    # --- Metrics ---
+    # /metrics is served on the web server. If METRICS_TOKEN is set, scrapers must pass it
+    # as ?token=... or an 'Authorization: Bearer' header.
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    # With STREAM_WORKERS, the bot process serves its own /metrics on this port (0 = off).
+    METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
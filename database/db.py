@@ -1,15 +1,33 @@
 # widhvans/store/widhvans-store-a32dae6d5f5487c7bc78b13e2cdc18082aef6c58/database/db.py
 
+import asyncio
+import collections
+import copy
 import datetime
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from config import Config
+from utils.cache import TTLCache
+from utils.file_search import FileSearchIndex, search_tokens
+from util.metrics import MongoCommandListener, MONGO_UNINDEXED
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-client = AsyncIOMotorClient(Config.MONGO_URI)
-db = client[Config.DATABASE_NAME]
 logger = logging.getLogger(__name__)
 
+# Slow query commands waiting for report_slow_queries() to check their plans.
+# Filled on driver threads; bounded so a process that never reports can't grow it.
+_slow_queries = collections.deque(maxlen=100)
+
+def _record_slow_query(command_name, command, seconds):
+    _slow_queries.append((command_name, command, seconds))
+
+client = AsyncIOMotorClient(Config.MONGO_URI, event_listeners=[
+    MongoCommandListener(Config.SLOW_QUERY_MS, _record_slow_query if Config.SLOW_QUERY_MS > 0 else None)
+])
+db = client[Config.DATABASE_NAME]
+
 users = db['users']
 files = db['files']
 posts = db['posts']
@@ -18,6 +36,200 @@ verified_users = db['verified_users']
 # --- NEW: Collections for Daily Stats ---
 daily_stats = db['daily_stats']
 monthly_records = db['monthly_records']
+# Durable queue of files waiting to be copied, saved and posted.
+ingest_queue = db['ingest_queue']
+# IMDb title resolutions by normalized cleaned title, including rejected lookups.
+imdb_titles = db['imdb_titles']
+# Poster URLs by normalized title and year, including searches that found nothing.
+poster_cache = db['poster_cache']
+# Telegram file_id of each poster URL after its first upload, so it is only fetched once.
+poster_files = db['poster_files']
+# Shortened deep links per owner, shortener domain and API key.
+shortlinks = db['shortlinks']
+
+# How long finished ingest jobs are kept, so replays of the same file are ignored.
+INGEST_DONE_RETENTION = datetime.timedelta(days=7)
+
+# Every index the queries in this module rely on. ensure_indexes() creates them at
+# startup; creating an index that already exists is a no-op.
+INDEXES = {
+    users: [
+        IndexModel([('user_id', 1)], unique=True),
+        IndexModel([('index_db_channel', 1)]),
+    ],
+    files: [
+        IndexModel([('owner_id', 1), ('file_unique_id', 1)], unique=True),
+        # "My files" pages are listed newest first.
+        IndexModel([('owner_id', 1), ('_id', -1)]),
+    ],
+    posts: [
+        IndexModel([('owner_id', 1), ('message_id', 1)], unique=True),
+        IndexModel([('owner_id', 1), ('post_channel_id', 1), ('message_id', 1)]),
+    ],
+    verified_users: [
+        IndexModel([('requester_id', 1), ('owner_id', 1)], unique=True),
+        # is_user_verified() decides validity (12 hours); this TTL is only a deliberately
+        # looser bound for garbage-collecting verifications nobody can use any more.
+        IndexModel([('verified_at', 1)], expireAfterSeconds=24 * 3600),
+    ],
+    daily_stats: [
+        IndexModel([('owner_id', 1), ('date', 1)], unique=True),
+    ],
+    monthly_records: [
+        IndexModel([('owner_id', 1)], unique=True),
+    ],
+    ingest_queue: [
+        IndexModel([('status', 1), ('created_at', 1)]),
+        IndexModel([('owner_id', 1), ('copied_message_id', 1)]),
+        IndexModel([('expire_at', 1)], expireAfterSeconds=0),
+    ],
+    imdb_titles: [IndexModel([('expire_at', 1)], expireAfterSeconds=0)],
+    poster_cache: [IndexModel([('expire_at', 1)], expireAfterSeconds=0)],
+    shortlinks: [IndexModel([('expire_at', 1)], expireAfterSeconds=0)],
+}
+
+# Indexes once declared here and since removed; ensure_indexes() drops them if present.
+# daily_stats 'date_1' was a TTL that deleted view history older than 60 days.
+RETIRED_INDEXES = {
+    daily_stats: ['date_1'],
+}
+
+async def ensure_indexes():
+    """
+    Creates the declared indexes. A unique index that can't be built because of
+    existing duplicates is created as a plain index instead, so lookups are still
+    index-backed, and the duplicates are reported.
+    """
+    for collection, models in INDEXES.items():
+        for model in models:
+            spec = model.document
+            try:
+                await collection.create_indexes([model])
+            except DuplicateKeyError:
+                logger.error(f"Duplicate documents in '{collection.name}' prevent the unique index {dict(spec['key'])}. Creating it as non-unique; remove the duplicates to enforce uniqueness.")
+                options = {k: v for k, v in spec.items() if k not in ('key', 'name', 'unique')}
+                await collection.create_index(list(spec['key'].items()), **options)
+            except OperationFailure as e:
+                logger.error(f"Could not create index {dict(spec['key'])} on '{collection.name}': {e}")
+    for collection, names in RETIRED_INDEXES.items():
+        existing = await collection.index_information()
+        for name in names:
+            if name in existing:
+                await collection.drop_index(name)
+                logger.info(f"Dropped retired index '{name}' on '{collection.name}'.")
+    logger.info("MongoDB indexes are in place.")
+
+# Fields the driver adds to commands that explain doesn't accept.
+_DRIVER_FIELDS = {'lsid', 'txnNumber', 'readConcern', 'writeConcern', 'startTransaction', 'autocommit'}
+# (command, collection, filter shape) -> whether its plan scans the collection.
+_explained_shapes = {}
+
+def _query_filter(command_name: str, command) -> dict:
+    if command_name == 'find':
+        return command.get('filter') or {}
+    if command_name in ('count', 'distinct', 'findAndModify'):
+        return command.get('query') or {}
+    if command_name in ('update', 'delete'):
+        statements = command.get(f"{command_name}s") or [{}]
+        return statements[0].get('q') or {}
+    # aggregate: only a leading $match can use an index.
+    pipeline = command.get('pipeline') or [{}]
+    return pipeline[0].get('$match') or {}
+
+def _query_shape(value):
+    """The filter with its values blanked, so queries that differ only in values match."""
+    if isinstance(value, dict):
+        return {key: _query_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [_query_shape(item) for item in value]
+    return 1
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+        return any(_has_collscan(item) for key, item in plan.items() if key != 'rejectedPlans')
+    if isinstance(plan, list):
+        return any(_has_collscan(item) for item in plan)
+    return False
+
+async def _explain(command_name: str, command) -> dict:
+    explainable = {key: value for key, value in command.items() if not key.startswith('$') and key not in _DRIVER_FIELDS}
+    if command_name in ('update', 'delete'):
+        field = f"{command_name}s"
+        explainable[field] = explainable[field][:1]
+    database = client[command.get('$db', Config.DATABASE_NAME)]
+    return await database.command({'explain': explainable, 'verbosity': 'queryPlanner'})
+
+async def report_slow_queries(interval: float = 10):
+    """
+    Explains the slow queries the command listener captured and reports those whose
+    winning plan is a collection scan, i.e. a query no index serves. Each query
+    shape is explained and logged once; mongo_unindexed_slow_queries_total counts
+    every slow occurrence.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        while _slow_queries:
+            command_name, command, seconds = _slow_queries.popleft()
+            collection = command.get(command_name)
+            shape = _query_shape(_query_filter(command_name, command))
+            key = (command_name, collection, repr(shape))
+            if key not in _explained_shapes:
+                try:
+                    _explained_shapes[key] = _has_collscan(await _explain(command_name, command))
+                except Exception as e:
+                    logger.debug(f"Could not explain slow {command_name} on '{collection}': {e}")
+                    _explained_shapes[key] = False
+                if _explained_shapes[key]:
+                    logger.warning(f"Slow {command_name} on '{collection}' ({seconds * 1000:.0f}ms) scans the whole collection; no index serves the filter {shape}.")
+            if _explained_shapes[key]:
+                MONGO_UNINDEXED.inc(command=command_name, collection=collection)
+
+# User settings documents are read many times per file and batch but rarely change.
+# Every writer below invalidates its user; watch_user_changes() covers other processes.
+_user_cache = TTLCache(maxsize=10000, ttl=Config.USER_CACHE_TTL)
+_index_owner_cache = TTLCache(maxsize=10000, ttl=Config.USER_CACHE_TTL)  # index channel -> owner id
+_NO_OWNER = 0
+# Bumped on every invalidation, so a read that raced a write doesn't cache the old document.
+_user_cache_generation = 0
+
+def invalidate_user(user_id=None):
+    """Drops a cached user settings document, or all of them if user_id is None."""
+    global _user_cache_generation
+    _user_cache_generation += 1
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(user_id)
+    # Any user change may move an index channel, and this map is cheap to rebuild.
+    _index_owner_cache.clear()
+
+async def _get_user_doc(user_id):
+    user = _user_cache.get(user_id)
+    if user is None:
+        generation = _user_cache_generation
+        user = await users.find_one({'user_id': user_id})
+        if user is None:
+            return None
+        if generation == _user_cache_generation:
+            _user_cache.set(user_id, user)
+    # Callers get their own copy, so the cached document can't be changed by accident.
+    return copy.deepcopy(user)
+
+async def watch_user_changes():
+    """
+    Invalidates cached users on every change to the users collection, including
+    changes made by other processes. Needs a replica set; without one the TTL
+    alone bounds how stale another process's writes can appear.
+    """
+    try:
+        async with users.watch(full_document='updateLookup') as stream:
+            async for change in stream:
+                document = change.get('fullDocument')
+                invalidate_user(document.get('user_id') if document else None)
+    except OperationFailure as e:
+        logger.info(f"MongoDB change streams unavailable ({e}); user settings are cached for {Config.USER_CACHE_TTL}s.")
 
 
 async def add_user(user_id):
@@ -40,6 +252,7 @@ async def add_user(user_id):
         'backup_channels': []
     }
     await users.update_one({'user_id': user_id}, {"$setOnInsert": user_data}, upsert=True)
+    invalidate_user(user_id)
 
 # --- NEW: Functions for Daily Stats Feature ---
 
@@ -145,40 +358,44 @@ async def claim_verification_for_file(owner_id: int, file_unique_id: str, reques
 async def set_post_channel(user_id: int, channel_id: int):
     """Saves the post channel ID for a specific user."""
     await users.update_one({'user_id': user_id}, {'$addToSet': {'post_channels': channel_id}})
+    invalidate_user(user_id)
 
 async def get_post_channels(user_id: int):
     """Retrieves all post channel IDs for a specific user."""
-    user = await users.find_one({'user_id': user_id})
+    user = await _get_user_doc(user_id)
     return user.get('post_channels', []) if user else []
 
 # --- LEGENDARY MODIFICATION: This function is now deprecated in favor of get_post_channels ---
 async def get_post_channel(user_id: int):
     """Retrieves the FIRST post channel ID for a specific user. Kept for backward compatibility where only one is needed."""
-    user = await users.find_one({'user_id': user_id})
+    user = await _get_user_doc(user_id)
     # Assuming one post channel for now, can be modified for multiple
     return user.get('post_channels')[0] if user and user.get('post_channels') else None
 
 async def set_index_db_channel(user_id: int, channel_id: int):
     """Saves the index DB channel ID for a specific user."""
     await users.update_one({'user_id': user_id}, {'$set': {'index_db_channel': channel_id}}, upsert=True)
+    invalidate_user(user_id)
 
 async def get_index_db_channel(user_id: int):
     """Retrieves the index DB channel ID for a specific user."""
-    user = await users.find_one({'user_id': user_id})
+    user = await _get_user_doc(user_id)
     return user.get('index_db_channel') if user else None
 
 # --- LEGENDARY ADDITION: Functions to manage multiple backup channels ---
 async def add_backup_channel(user_id: int, channel_id: int):
     """Adds a new backup channel to the user's list."""
     await users.update_one({'user_id': user_id}, {'$addToSet': {'backup_channels': channel_id}})
+    invalidate_user(user_id)
 
 async def remove_backup_channel(user_id: int, channel_id: int):
     """Removes a backup channel from the user's list."""
     await users.update_one({'user_id': user_id}, {'$pull': {'backup_channels': channel_id}})
+    invalidate_user(user_id)
 
 async def get_backup_channels(user_id: int):
     """Retrieves all backup channel IDs for a user."""
-    user = await users.find_one({'user_id': user_id})
+    user = await _get_user_doc(user_id)
     return user.get('backup_channels', []) if user else []
 # --- END LEGENDARY ADDITION ---
 
@@ -195,15 +412,176 @@ async def save_file_data(owner_id, original_message, copied_message, stream_mess
         'stream_id': stream_message.id,
         'file_name': original_media.file_name,
         'file_size': original_media.file_size,
-        'raw_link': raw_link
+        'raw_link': raw_link,
+        'search_tokens': search_tokens(original_media.file_name)
     }
-    await files.update_one(
+    result = await files.update_one(
         {'owner_id': owner_id, 'file_unique_id': original_media.file_unique_id},
         {'$set': file_data}, upsert=True
     )
+    _file_versions[owner_id] += 1
+    count = _file_counts.get(owner_id)
+    if count is not None and result.upserted_id is not None:
+        _file_counts.set(owner_id, count + 1)
+    index = _search_indexes.get(owner_id)
+    if index is not None:
+        if result.upserted_id is not None:
+            index.add(result.upserted_id, file_data['file_unique_id'], file_data['file_name'], file_data['search_tokens'])
+        else:
+            # A file saved again may have been renamed; rebuild on the next search.
+            _search_indexes.pop(owner_id)
+
+async def enqueue_ingest_job(owner_id: int, message):
+    """
+    Records a new file in the ingest queue. Jobs are keyed by owner and
+    file_unique_id, so a file that is already queued or was recently processed
+    is not queued again; a file whose job failed is queued again. Returns the
+    job id, or None for a duplicate.
+    """
+    media = getattr(message, message.media.value)
+    job_id = f"{owner_id}:{media.file_unique_id}"
+    now = datetime.datetime.utcnow()
+    job = {
+        'owner_id': owner_id,
+        'file_unique_id': media.file_unique_id,
+        'file_name': media.file_name,
+        'source_chat_id': message.chat.id,
+        'source_message_id': message.id,
+        'status': 'pending',
+        'attempts': 0,
+        'created_at': now,
+        'updated_at': now
+    }
+    try:
+        await ingest_queue.insert_one({'_id': job_id, **job})
+    except DuplicateKeyError:
+        requeued = await ingest_queue.find_one_and_update(
+            {'_id': job_id, 'status': 'failed'},
+            {'$set': job, '$unset': {'expire_at': "", 'error': "", 'copied_message_id': ""}}
+        )
+        return job_id if requeued else None
+    return job_id
+
+async def claim_ingest_job(exclude_owners=()):
+    """Atomically takes the oldest pending job of an owner that isn't being worked on."""
+    return await ingest_queue.find_one_and_update(
+        {'status': 'pending', 'owner_id': {'$nin': list(exclude_owners)}},
+        {'$set': {'status': 'processing', 'updated_at': datetime.datetime.utcnow()}, '$inc': {'attempts': 1}},
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def update_ingest_job(job_id: str, status: str, **fields):
+    update = {'status': status, 'updated_at': datetime.datetime.utcnow(), **fields}
+    if status in ('done', 'skipped', 'failed'):
+        update['expire_at'] = datetime.datetime.utcnow() + INGEST_DONE_RETENTION
+    await ingest_queue.update_one({'_id': job_id}, {'$set': update})
+
+async def mark_ingest_jobs_posted(owner_id: int, copied_message_ids):
+    """Closes the jobs whose copied files have been posted."""
+    await ingest_queue.update_many(
+        {'owner_id': owner_id, 'copied_message_id': {'$in': list(copied_message_ids)}},
+        {'$set': {
+            'status': 'done',
+            'updated_at': datetime.datetime.utcnow(),
+            'expire_at': datetime.datetime.utcnow() + INGEST_DONE_RETENTION
+        }}
+    )
+
+async def reset_interrupted_ingest_jobs():
+    """Puts jobs that were mid-copy when the bot stopped back in the queue. Returns how many."""
+    result = await ingest_queue.update_many({'status': 'processing'}, {'$set': {'status': 'pending'}})
+    return result.modified_count
+
+async def count_pending_ingest_jobs():
+    return await ingest_queue.count_documents({'status': {'$in': ['pending', 'processing']}})
+
+async def get_unposted_ingest_jobs():
+    """Jobs whose file was copied and saved but whose batch was never posted."""
+    cursor = ingest_queue.find({'status': 'copied'}).sort('created_at', 1)
+    return await cursor.to_list(length=None)
+
+async def get_cached_imdb_title(key: str):
+    """Returns the stored resolution for a normalized title, or None if there is none."""
+    return await imdb_titles.find_one({'_id': key, 'expire_at': {'$gt': datetime.datetime.utcnow()}})
+
+async def save_cached_imdb_title(key: str, title, year, ttl: datetime.timedelta):
+    """Stores a resolution. A None title records that IMDb had no acceptable match."""
+    await imdb_titles.update_one(
+        {'_id': key},
+        {'$set': {
+            'title': title,
+            'year': year,
+            'updated_at': datetime.datetime.utcnow(),
+            'expire_at': datetime.datetime.utcnow() + ttl
+        }},
+        upsert=True
+    )
+
+async def get_cached_poster(key: str):
+    """Returns the stored poster search result for a title/year key, or None if there is none."""
+    return await poster_cache.find_one({'_id': key, 'expire_at': {'$gt': datetime.datetime.utcnow()}})
+
+async def save_cached_poster(key: str, poster_url, ttl: datetime.timedelta):
+    """Stores a poster search result. A None poster_url records that nothing was found."""
+    await poster_cache.update_one(
+        {'_id': key},
+        {'$set': {
+            'poster_url': poster_url,
+            'updated_at': datetime.datetime.utcnow(),
+            'expire_at': datetime.datetime.utcnow() + ttl
+        }},
+        upsert=True
+    )
+
+async def get_poster_file_id(poster_url: str):
+    doc = await poster_files.find_one({'_id': poster_url})
+    return doc.get('file_id') if doc else None
+
+async def save_poster_file_id(poster_url: str, file_id: str):
+    await poster_files.update_one(
+        {'_id': poster_url},
+        {'$set': {'file_id': file_id, 'updated_at': datetime.datetime.utcnow()}},
+        upsert=True
+    )
+
+async def delete_poster_file_id(poster_url: str):
+    await poster_files.delete_one({'_id': poster_url})
+
+async def get_cached_shortlinks(keys, api_key_hash: str) -> dict:
+    """Returns {key: short_url} for the keys shortened with the same API key."""
+    cursor = shortlinks.find({
+        '_id': {'$in': list(keys)},
+        'api_key_hash': api_key_hash,
+        'expire_at': {'$gt': datetime.datetime.utcnow()}
+    })
+    return {doc['_id']: doc['short_url'] async for doc in cursor}
+
+async def save_cached_shortlinks(short_urls: dict, api_key_hash: str, ttl: datetime.timedelta):
+    """Stores {key: short_url} in one round trip."""
+    if not short_urls:
+        return
+    now = datetime.datetime.utcnow()
+    await shortlinks.bulk_write([
+        UpdateOne(
+            {'_id': key},
+            {'$set': {'short_url': short_url, 'api_key_hash': api_key_hash, 'updated_at': now, 'expire_at': now + ttl}},
+            upsert=True
+        )
+        for key, short_url in short_urls.items()
+    ], ordered=False)
+
+async def get_media_dcs():
+    """Returns the Telegram DCs that streamed files have been served from."""
+    settings = await bot_settings.find_one({'_id': 'media_dcs'})
+    return settings.get('dc_ids', []) if settings else []
+
+async def add_media_dc(dc_id: int):
+    """Remembers a DC so its media sessions are pre-warmed on the next start."""
+    await bot_settings.update_one({'_id': 'media_dcs'}, {'$addToSet': {'dc_ids': dc_id}}, upsert=True)
 
 async def get_user(user_id):
-    return await users.find_one({'user_id': user_id})
+    return await _get_user_doc(user_id)
 
 async def get_all_user_ids(storage_owners_only=False):
     query = {}
@@ -230,39 +608,101 @@ async def get_storage_owners_count():
 
 async def update_user(user_id, key, value):
     await users.update_one({'user_id': user_id}, {'$set': {key: value}}, upsert=True)
+    invalidate_user(user_id)
 
 async def add_to_list(user_id, list_name, item):
     await users.update_one({'user_id': user_id}, {'$addToSet': {list_name: item}})
+    invalidate_user(user_id)
 
 async def remove_from_list(user_id, list_name, item):
     await users.update_one({'user_id': user_id}, {'$pull': {list_name: item}})
+    invalidate_user(user_id)
 
 async def find_owner_by_index_channel(channel_id):
-    user = await users.find_one({'index_db_channel': channel_id})
-    return user['user_id'] if user else None
+    owner_id = _index_owner_cache.get(channel_id)
+    if owner_id is None:
+        generation = _user_cache_generation
+        user = await users.find_one({'index_db_channel': channel_id}, {'user_id': 1})
+        owner_id = user['user_id'] if user else _NO_OWNER
+        if generation == _user_cache_generation:
+            _index_owner_cache.set(channel_id, owner_id)
+    return owner_id if owner_id != _NO_OWNER else None
 
 async def get_file_by_unique_id(owner_id: int, file_unique_id: str):
     """Fetches a file based on its owner and unique_id."""
     return await files.find_one({'owner_id': owner_id, 'file_unique_id': file_unique_id})
 
+# Bumped when an owner's files change (None: all owners), so a count or search index
+# read while files were being saved isn't cached without them.
+_file_versions = collections.Counter()
+# Per-owner file counts, kept current by save_file_data and delete_all_files.
+_file_counts = TTLCache(maxsize=10000, ttl=3600)
+
 async def get_user_file_count(owner_id):
-    return await files.count_documents({'owner_id': owner_id})
+    count = _file_counts.get(owner_id)
+    if count is None:
+        version = (_file_versions[None], _file_versions[owner_id])
+        count = await files.count_documents({'owner_id': owner_id})
+        if version == (_file_versions[None], _file_versions[owner_id]):
+            _file_counts.set(owner_id, count)
+    return count
 
 async def get_all_user_files(user_id):
     return files.find({'owner_id': user_id})
 
-async def get_paginated_files(user_id, page: int, page_size: int = 5):
-    skip = (page - 1) * page_size
-    cursor = files.find({'owner_id': user_id}).sort('_id', -1).skip(skip).limit(page_size)
-    return await cursor.to_list(length=page_size)
+async def get_paginated_files(user_id, page_size: int = 5, after=None, before=None):
+    """
+    One page of the owner's files, newest first. Pages are found by _id rather than
+    skipped to, so every page costs the same: `after` gives the older files that
+    follow that _id, `before` the newer ones preceding it, neither the first page.
+    Returns the files and whether more exist in the direction paged.
+    """
+    query = {'owner_id': user_id}
+    if before is not None:
+        query['_id'] = {'$gt': before}
+        cursor = files.find(query).sort('_id', 1).limit(page_size + 1)
+        page = await cursor.to_list(length=page_size + 1)
+        return page[:page_size][::-1], len(page) > page_size
+    if after is not None:
+        query['_id'] = {'$lt': after}
+    cursor = files.find(query).sort('_id', -1).limit(page_size + 1)
+    page = await cursor.to_list(length=page_size + 1)
+    return page[:page_size], len(page) > page_size
+
+# Search runs on per-owner in-memory indexes of the stored search_tokens. An index
+# is built on the owner's first search and kept current by save_file_data.
+_search_indexes = TTLCache(maxsize=20, ttl=Config.SEARCH_INDEX_TTL)
+
+async def _get_search_index(owner_id) -> FileSearchIndex:
+    index = _search_indexes.get(owner_id)
+    if index is not None:
+        return index
+    version = (_file_versions[None], _file_versions[owner_id])
+    index = FileSearchIndex()
+    backfill = []
+    cursor = files.find({'owner_id': owner_id}, {'file_unique_id': 1, 'file_name': 1, 'search_tokens': 1}).sort('_id', 1)
+    async for doc in cursor:
+        tokens = doc.get('search_tokens')
+        if tokens is None:
+            # Saved before tokens were stored.
+            tokens = search_tokens(doc.get('file_name'))
+            backfill.append(UpdateOne({'_id': doc['_id']}, {'$set': {'search_tokens': tokens}}))
+        index.add(doc['_id'], doc['file_unique_id'], doc.get('file_name'), tokens)
+    if backfill:
+        await files.bulk_write(backfill, ordered=False)
+    if version == (_file_versions[None], _file_versions[owner_id]):
+        _search_indexes.set(owner_id, index)
+    return index
 
 async def search_user_files(user_id, query: str, page: int, page_size: int = 5):
-    search_filter = {'owner_id': user_id, 'file_name': {'$regex': query, '$options': 'i'}}
+    """
+    Returns one page of the owner's files matching every word of `query` (as word
+    prefixes, best matches first) and the number of matches.
+    """
+    index = await _get_search_index(user_id)
+    ranked = index.search(query)
     skip = (page - 1) * page_size
-    total_files = await files.count_documents(search_filter)
-    cursor = files.find(search_filter).sort('_id', -1).skip(skip).limit(page_size)
-    files_list = await cursor.to_list(length=page_size)
-    return files_list, total_files
+    return [index.file(number) for number in ranked[skip:skip + page_size]], len(ranked)
 
 async def total_users_count():
     return await users.count_documents({})
@@ -270,15 +710,21 @@ async def total_users_count():
 async def add_footer_button(user_id, button_name, button_url):
     button = {'name': button_name, 'url': button_url}
     await users.update_one({'user_id': user_id}, {'$push': {'footer_buttons': button}})
+    invalidate_user(user_id)
 
 async def remove_footer_button(user_id, button_name):
     await users.update_one({'user_id': user_id}, {'$pull': {'footer_buttons': {'name': button_name}}})
+    invalidate_user(user_id)
 
 async def remove_all_footer_buttons(user_id):
     await users.update_one({'user_id': user_id}, {'$set': {'footer_buttons': []}})
+    invalidate_user(user_id)
 
 async def delete_all_files():
     result = await files.delete_many({})
+    _file_versions[None] += 1
+    _file_counts.clear()
+    _search_indexes.clear()
     return result.deleted_count
 
 # --- New Functions for Smart Backup ---
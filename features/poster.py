@@ -1,9 +1,17 @@
 import asyncio
-import aiohttp
+import datetime
 from bs4 import BeautifulSoup
 import logging
 import re
 from config import Config
+from database.db import (
+    get_cached_poster, save_cached_poster,
+    get_poster_file_id, save_poster_file_id, delete_poster_file_id
+)
+from pyrogram.errors import MediaEmpty, FileIdInvalid, FileReferenceExpired, WebpageCurlFailed, WebpageMediaEmpty
+from util.http import get_session
+from util.metrics import EXTERNAL_SECONDS, EXTERNAL_RESULTS
+from utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -19,24 +27,28 @@ def generate_search_queries(title: str):
 
 async def _find_poster_from_imdb(query: str):
     """Internal function to get the best-guess poster from IMDb for a single query."""
+    with EXTERNAL_SECONDS.time(service="poster_imdb"):
+        return await _scrape_poster_from_imdb(query)
+
+async def _scrape_poster_from_imdb(query: str):
     try:
-        search_url = f"https://www.imdb.com/find?q={re.sub(r'\s+', '+', query)}"
+        search_url = f"https://www.imdb.com/find?q={'+'.join(query.split())}"
         headers = {'User-Agent': 'Mozilla/5.0', 'Accept-Language': 'en-US,en;q=0.5'}
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(search_url, timeout=10) as resp:
-                if resp.status != 200: return None
-                soup = BeautifulSoup(await resp.text(), 'html.parser')
-                result_link = soup.select_one("a.ipc-metadata-list-summary-item__t")
-                if not result_link or not result_link.get('href'): return None
-                
-                movie_url = "https://www.imdb.com" + result_link['href'].split('?')[0]
-                async with session.get(movie_url, timeout=10) as movie_resp:
-                    if movie_resp.status != 200: return None
-                    movie_soup = BeautifulSoup(await movie_resp.text(), 'html.parser')
-                    img_tag = movie_soup.select_one('div[data-testid="hero-media__poster"] img.ipc-image')
-                    if img_tag and img_tag.get('src'):
-                        poster_url = img_tag['src'].split('_V1_')[0] + "_V1_FMjpg_UX1000_.jpg"
-                        return poster_url
+        session = get_session()
+        async with session.get(search_url, headers=headers) as resp:
+            if resp.status != 200: return None
+            soup = BeautifulSoup(await resp.text(), 'html.parser')
+            result_link = soup.select_one("a.ipc-metadata-list-summary-item__t")
+            if not result_link or not result_link.get('href'): return None
+            
+        movie_url = "https://www.imdb.com" + result_link['href'].split('?')[0]
+        async with session.get(movie_url, headers=headers) as movie_resp:
+            if movie_resp.status != 200: return None
+            movie_soup = BeautifulSoup(await movie_resp.text(), 'html.parser')
+            img_tag = movie_soup.select_one('div[data-testid="hero-media__poster"] img.ipc-image')
+            if img_tag and img_tag.get('src'):
+                poster_url = img_tag['src'].split('_V1_')[0] + "_V1_FMjpg_UX1000_.jpg"
+                return poster_url
     except Exception:
         return None
     return None
@@ -44,49 +56,160 @@ async def _find_poster_from_imdb(query: str):
 async def _find_poster_from_tmdb(query: str, year: str = None):
     """Internal function to get the best-guess poster from TMDB for a single query."""
     if not Config.TMDB_API_KEY: return None
+    with EXTERNAL_SECONDS.time(service="poster_tmdb"):
+        return await _search_poster_on_tmdb(query, year)
+
+async def _search_poster_on_tmdb(query: str, year: str = None):
     try:
         search_url = "https://api.themoviedb.org/3/search/multi"
         params = {"api_key": Config.TMDB_API_KEY, "query": query, "include_adult": "false"}
         if year: params['year'] = year
-        async with aiohttp.ClientSession() as session:
-            async with session.get(search_url, params=params, timeout=10) as resp:
-                if resp.status != 200: return None
-                data = await resp.json()
-                if data.get('results') and data['results'][0].get("poster_path"):
-                    return f"https://image.tmdb.org/t/p/w500{data['results'][0]['poster_path']}"
+        async with get_session().get(search_url, params=params) as resp:
+            if resp.status != 200: return None
+            data = await resp.json()
+            if data.get('results') and data['results'][0].get("poster_path"):
+                return f"https://image.tmdb.org/t/p/w500{data['results'][0]['poster_path']}"
     except Exception:
         return None
     return None
 
+# Found posters rarely change; misses are retried sooner in case a source gains the title.
+POSTER_FOUND_TTL = datetime.timedelta(days=30)
+POSTER_MISS_TTL = datetime.timedelta(days=1)
+_poster_memory_cache = TTLCache(maxsize=2000, ttl=6 * 3600)
+
 async def get_poster(query: str, year: str = None):
     """
     The definitive 'waterfall' poster finder. It tries every possible combination
-    of truncated queries and sources until it gets a match.
+    of truncated queries and sources until it gets a match. Results, misses
+    included, are cached in memory and in MongoDB per normalized title and year.
+    """
+    normalized_query = " ".join(query.replace('"', '').lower().split())
+    key = f"{normalized_query}|{year or ''}"
+    cached = _poster_memory_cache.get(key)
+    if cached is not None:
+        EXTERNAL_RESULTS.inc(service="poster_cache", result="hit_memory")
+        return cached or None
+    try:
+        stored = await get_cached_poster(key)
+    except Exception as e:
+        logger.error(f"Could not read the poster cache for '{key}': {e}")
+        stored = None
+    if stored:
+        EXTERNAL_RESULTS.inc(service="poster_cache", result="hit_mongo")
+        _poster_memory_cache.set(key, stored.get('poster_url') or "")
+        return stored.get('poster_url')
+    EXTERNAL_RESULTS.inc(service="poster_cache", result="miss")
+
+    with EXTERNAL_SECONDS.time(service="poster"):
+        poster = await _poster_waterfall(query, year)
+    EXTERNAL_RESULTS.inc(service="poster", result="found" if poster else "empty")
+
+    ttl = POSTER_FOUND_TTL if poster else POSTER_MISS_TTL
+    # Misses are kept as "" so they can be told apart from "not cached".
+    _poster_memory_cache.set(key, poster or "", ttl=min(_poster_memory_cache.ttl, ttl.total_seconds()))
+    try:
+        await save_cached_poster(key, poster, ttl)
+    except Exception as e:
+        logger.error(f"Could not store the poster search result for '{key}': {e}")
+    return poster
+
+def _poster_attempts(query: str, year: str = None):
+    """Every (description, coroutine function, args) to try, most preferred first."""
+    attempts = []
+    for sq in generate_search_queries(query):
+        # --- IMDb First (User Preference) ---
+        if year: attempts.append((f"IMDb with year for '{sq}'", _find_poster_from_imdb, (f"{sq} {year}",)))
+        attempts.append((f"IMDb without year for '{sq}'", _find_poster_from_imdb, (sq,)))
+        # --- TMDB Second (API Fallback) ---
+        if Config.TMDB_API_KEY:
+            if year: attempts.append((f"TMDB with year for '{sq}'", _find_poster_from_tmdb, (sq, year)))
+            attempts.append((f"TMDB without year for '{sq}'", _find_poster_from_tmdb, (sq,)))
+    return attempts
+
+async def _poster_waterfall(query: str, year: str = None):
+    """
+    Runs the attempts as a race that still honours their order: up to
+    POSTER_SEARCH_CONCURRENCY run at once, started in preference order, and a
+    hit only wins once every more preferred attempt has missed. As soon as an
+    attempt hits, every less preferred one is cancelled, as it can no longer win.
     """
     # Final guardrail: Sanitize the query to remove stray characters like quotes
     sanitized_query = query.replace('"', '').strip()
     
-    search_queries = generate_search_queries(sanitized_query)
-    logger.info(f"Waterfall Search: Starting for '{sanitized_query}'. Queries: {search_queries}")
+    attempts = _poster_attempts(sanitized_query, year)
+    logger.info(f"Waterfall Search: Starting for '{sanitized_query}' with {len(attempts)} attempts.")
 
-    for sq in search_queries:
-        logger.info(f"Waterfall Search: Trying query '{sq}'...")
-        
-        # --- IMDb First (User Preference) ---
-        if year:
-            poster = await _find_poster_from_imdb(f"{sq} {year}")
-            if poster: logger.info(f"SUCCESS: IMDb with year for '{sq}'"); return poster
-        
-        poster = await _find_poster_from_imdb(sq)
-        if poster: logger.info(f"SUCCESS: IMDb without year for '{sq}'"); return poster
-        
-        # --- TMDB Second (API Fallback) ---
-        if year:
-            poster = await _find_poster_from_tmdb(sq, year)
-            if poster: logger.info(f"SUCCESS: TMDB with year for '{sq}'"); return poster
-        
-        poster = await _find_poster_from_tmdb(sq)
-        if poster: logger.info(f"SUCCESS: TMDB without year for '{sq}'"); return poster
+    semaphore = asyncio.Semaphore(max(1, Config.POSTER_SEARCH_CONCURRENCY))
+
+    async def run(func, args):
+        async with semaphore:
+            return await func(*args)
+
+    tasks = [asyncio.create_task(run(func, args)) for _, func, args in attempts]
+
+    def cancel_less_preferred(index, task):
+        if not task.cancelled() and task.exception() is None and task.result():
+            for later in tasks[index + 1:]:
+                later.cancel()
+
+    for index, task in enumerate(tasks):
+        task.add_done_callback(lambda t, i=index: cancel_less_preferred(i, t))
+
+    try:
+        for (description, _, _), task in zip(attempts, tasks):
+            poster = await task
+            if poster:
+                logger.info(f"SUCCESS: {description}")
+                return poster
+    finally:
+        for task in tasks:
+            task.cancel()
 
     logger.error(f"Waterfall Search: All attempts failed for base query '{query}'.")
     return None
+
+# Telegram rejected the photo itself; the bot and the chat are fine.
+POSTER_MEDIA_ERRORS = (MediaEmpty, FileIdInvalid, FileReferenceExpired, WebpageCurlFailed, WebpageMediaEmpty)
+_poster_file_ids = TTLCache(maxsize=2000, ttl=24 * 3600)
+
+async def _stored_poster_file_id(poster_url: str):
+    file_id = _poster_file_ids.get(poster_url)
+    if file_id is None:
+        try:
+            file_id = await get_poster_file_id(poster_url)
+        except Exception as e:
+            logger.error(f"Could not read the stored file_id of poster {poster_url}: {e}")
+            return None
+        if file_id:
+            _poster_file_ids.set(poster_url, file_id)
+    return file_id
+
+async def send_poster(send_photo, poster_url: str, **kwargs):
+    """
+    Sends a poster with `send_photo(photo=..., **kwargs)`. The first upload of a
+    poster URL makes Telegram fetch the image; its file_id is then remembered,
+    and every later post or backup of that poster is sent by file_id instead.
+    """
+    file_id = await _stored_poster_file_id(poster_url)
+    if file_id:
+        try:
+            EXTERNAL_RESULTS.inc(service="poster_file_id", result="hit")
+            return await send_photo(photo=file_id, **kwargs)
+        except (MediaEmpty, FileIdInvalid, FileReferenceExpired) as e:
+            logger.warning(f"Stored file_id of poster {poster_url} was rejected ({type(e).__name__}). Uploading from the URL again.")
+            _poster_file_ids.pop(poster_url)
+            try:
+                await delete_poster_file_id(poster_url)
+            except Exception as e:
+                logger.error(f"Could not drop the stored file_id of poster {poster_url}: {e}")
+
+    EXTERNAL_RESULTS.inc(service="poster_file_id", result="miss")
+    message = await send_photo(photo=poster_url, **kwargs)
+    if message and message.photo:
+        _poster_file_ids.set(poster_url, message.photo.file_id)
+        try:
+            await save_poster_file_id(poster_url, message.photo.file_id)
+        except Exception as e:
+            logger.error(f"Could not store the file_id of poster {poster_url}: {e}")
+    return message
@@ -1,9 +1,16 @@
 # features/shortener.py (FINAL FIXED VERSION)
 
-import aiohttp
 import asyncio
+import datetime
+import hashlib
 import logging
-from database.db import get_user, update_user
+import time
+from config import Config
+from database.db import get_user, update_user, get_cached_shortlinks, save_cached_shortlinks
+from util.circuit_breaker import CircuitBreaker
+from util.http import get_session
+from util.metrics import EXTERNAL_SECONDS, EXTERNAL_RESULTS
+from utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +24,17 @@ async def validate_shortener(domain: str, api_key: str) -> bool:
         url = f'https://{domain.strip()}/api'
         params = {'api': api_key.strip(), 'url': 'https://telegram.org'}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, ssl=False, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"Validation failed: HTTP Status {response.status}")
-                    return False
-                
-                data = await response.json(content_type=None)
-                if data.get("status") == "success" and data.get("shortenedUrl"):
-                    shortened_url = data["shortenedUrl"]
-                    if isinstance(shortened_url, str) and shortened_url.startswith(('http://', 'https://')):
-                        logger.info("Shortener validation successful.")
-                        return True
+        async with get_session().get(url, params=params, ssl=False) as response:
+            if response.status != 200:
+                logger.error(f"Validation failed: HTTP Status {response.status}")
+                return False
+            
+            data = await response.json(content_type=None)
+            if data.get("status") == "success" and data.get("shortenedUrl"):
+                shortened_url = data["shortenedUrl"]
+                if isinstance(shortened_url, str) and shortened_url.startswith(('http://', 'https://')):
+                    logger.info("Shortener validation successful.")
+                    return True
         
         logger.error(f"Validation failed: API returned error: {data.get('message', 'Unknown error')}")
         return False
@@ -37,41 +43,148 @@ async def validate_shortener(domain: str, api_key: str) -> bool:
         return False
 
 
+# Shortened links stay valid on the shortener's side; a month keeps backups cheap.
+SHORTLINK_TTL = datetime.timedelta(days=30)
+_shortlink_memory_cache = TTLCache(maxsize=20000, ttl=6 * 3600)
+
+
+_breakers = {}  # shortener domain -> CircuitBreaker
+
+
+def _breaker(domain: str) -> CircuitBreaker:
+    """One breaker per shortener domain, shared by every user of that domain."""
+    breaker = _breakers.get(domain)
+    if breaker is None:
+        async def probe():
+            # Any answer below 500 means the domain is back; no API key is needed for that.
+            async with get_session().get(f'https://{domain}/', ssl=False, allow_redirects=False) as response:
+                return response.status < 500
+        breaker = _breakers[domain] = CircuitBreaker(f"shortener {domain}", probe)
+    return breaker
+
+
+def shortener_circuit_status():
+    """Returns (domain, state, seconds until the next probe) for every domain that isn't closed."""
+    return [(domain, breaker.state, breaker.retry_in) for domain, breaker in _breakers.items() if not breaker.allow()]
+
+
+def _api_key_hash(api_key: str) -> str:
+    # Links are credited to the API key's account, so a new key must not reuse old links.
+    return hashlib.sha1(api_key.encode()).hexdigest()[:16]
+
+
 async def get_shortlink(link_to_shorten, user_id):
     """
     Shortens the provided link using the user's settings.
     Now includes a retry mechanism and better validation.
     """
-    user = await get_user(user_id)
-    if not user or not user.get('shortener_enabled') or not user.get('shortener_url'):
-        return link_to_shorten
+    return (await shorten_links([link_to_shorten], user_id))[0]
+
+
+async def shorten_links(links, user_id, user: dict = None):
+    """
+    Shortens all of a post's links at once, in the same order. The user's settings
+    are loaded once (or taken from `user`). Links already shortened for this owner,
+    domain and API key come from the cache; the rest are shortened concurrently,
+    SHORTENER_CONCURRENCY at a time. A link that can't be shortened is returned as is.
+    """
+    links = list(links)
+    if user is None:
+        user = await get_user(user_id)
+    if not links or not user or not user.get('shortener_enabled') or not user.get('shortener_url'):
+        return links
 
-    URL = user['shortener_url'].strip()
-    API = user['shortener_api'].strip()
+    domain = user['shortener_url'].strip()
+    api_key = user['shortener_api'].strip()
+    api_key_hash = _api_key_hash(api_key)
 
+    def cache_key(link):
+        return f"{user_id}|{domain}|{link}"
+
+    short_urls = {}
+    for link in dict.fromkeys(links):
+        cached = _shortlink_memory_cache.get((cache_key(link), api_key_hash))
+        if cached:
+            short_urls[link] = cached
+    EXTERNAL_RESULTS.inc(len(short_urls), service="shortlink_cache", result="hit_memory")
+
+    missing = [link for link in dict.fromkeys(links) if link not in short_urls]
+    if missing:
+        try:
+            stored = await get_cached_shortlinks([cache_key(link) for link in missing], api_key_hash)
+        except Exception as e:
+            logger.error(f"Could not read the shortlink cache for user {user_id}: {e}")
+            stored = {}
+        for link in missing:
+            short_url = stored.get(cache_key(link))
+            if short_url:
+                short_urls[link] = short_url
+                _shortlink_memory_cache.set((cache_key(link), api_key_hash), short_url)
+        EXTERNAL_RESULTS.inc(len(stored), service="shortlink_cache", result="hit_mongo")
+        missing = [link for link in missing if link not in short_urls]
+
+    if missing:
+        EXTERNAL_RESULTS.inc(len(missing), service="shortlink_cache", result="miss")
+        semaphore = asyncio.Semaphore(max(1, Config.SHORTENER_CONCURRENCY))
+
+        async def shorten(link):
+            async with semaphore:
+                return await _shorten_with_api(domain, api_key, link, user_id)
+
+        results = await asyncio.gather(*[shorten(link) for link in missing])
+        fresh = {link: short_url for link, short_url in zip(missing, results) if short_url}
+        for link, short_url in fresh.items():
+            short_urls[link] = short_url
+            _shortlink_memory_cache.set((cache_key(link), api_key_hash), short_url)
+        try:
+            await save_cached_shortlinks({cache_key(link): short_url for link, short_url in fresh.items()}, api_key_hash, SHORTLINK_TTL)
+        except Exception as e:
+            logger.error(f"Could not store shortlinks for user {user_id}: {e}")
+
+    return [short_urls.get(link, link) for link in links]
+
+
+async def _shorten_with_api(domain: str, api_key: str, link_to_shorten: str, user_id):
+    """
+    Calls the shortener API with up to three attempts. Returns the short URL, or
+    None. While the domain's circuit is open no call is made at all.
+    """
+    breaker = _breaker(domain)
     for attempt in range(3):
+        if not breaker.allow():
+            logger.warning(f"Shortener {domain} is unreachable (circuit {breaker.state}). Using the original link for user {user_id}.")
+            EXTERNAL_RESULTS.inc(service="shortener", result="circuit_open")
+            return None
+        started = time.perf_counter()
         try:
-            url = f'https://{URL}/api'
-            params = {'api': API, 'url': link_to_shorten}
+            url = f'https://{domain}/api'
+            params = {'api': api_key, 'url': link_to_shorten}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, raise_for_status=True, ssl=False, timeout=10) as response:
-                    data = await response.json(content_type=None)
-                    
-                    if data.get("status") == "success" and data.get("shortenedUrl"):
-                        shortened_url = data["shortenedUrl"]
-                        if isinstance(shortened_url, str) and shortened_url.startswith(('http://', 'https://')):
-                            return shortened_url
-                        else:
-                            logger.error(f"Shortener API returned an invalid URL format: {shortened_url}")
+            async with get_session().get(url, params=params, raise_for_status=True, ssl=False) as response:
+                data = await response.json(content_type=None)
+                # The domain answered, even if the API reports an error below.
+                breaker.record_success()
+                
+                if data.get("status") == "success" and data.get("shortenedUrl"):
+                    shortened_url = data["shortenedUrl"]
+                    if isinstance(shortened_url, str) and shortened_url.startswith(('http://', 'https://')):
+                        EXTERNAL_SECONDS.observe(time.perf_counter() - started, service="shortener")
+                        EXTERNAL_RESULTS.inc(service="shortener", result="found")
+                        return shortened_url
                     else:
-                        logger.error(f"Shortener API error (Attempt {attempt + 1}/3): {data.get('message', 'Unknown error')}")
+                        logger.error(f"Shortener API returned an invalid URL format: {shortened_url}")
+                else:
+                    logger.error(f"Shortener API error (Attempt {attempt + 1}/3): {data.get('message', 'Unknown error')}")
 
         except Exception as e:
             logger.error(f"HTTP Error during shortening (Attempt {attempt + 1}/3): {e}")
+            breaker.record_failure()
+        EXTERNAL_SECONDS.observe(time.perf_counter() - started, service="shortener")
+        EXTERNAL_RESULTS.inc(service="shortener", result="error")
         
         if attempt < 2:
             await asyncio.sleep(1)
 
     logger.error(f"All shortener attempts failed for user {user_id}. Returning original link as a fallback.")
-    return link_to_shorten
+    EXTERNAL_RESULTS.inc(service="shortener", result="fallback")
+    return None
@@ -6,9 +6,11 @@ from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
 from database.db import (
     total_users_count, get_all_user_ids, get_storage_owners_count,
-    get_storage_owner_ids, get_normal_user_ids, delete_all_files
+    get_storage_owner_ids, get_normal_user_ids, delete_all_files,
+    count_pending_ingest_jobs
 )
 from features.broadcaster import broadcast_message
+from features.shortener import shortener_circuit_status
 from utils.helpers import go_back_button
 
 logger = logging.getLogger(__name__)
@@ -25,13 +27,34 @@ async def health_check_handler(client, message):
     # quarantine_size = client.quarantine_queue.qsize()
     
     open_batches_count = len(client.open_batches)
+    queued_files_count = await count_pending_ingest_jobs()
     
     text = (
         f"**🤖 Bot Health Status**\n\n"
         f"**Overall Status:** {status_icon} `{health_status}`\n"
         f"**Architecture:** `Direct Processing Model`\n\n"
         f"**Active Batches:** `{open_batches_count}` (users currently collecting files)\n"
+        f"**Queued Files:** `{queued_files_count}` (waiting in the ingest queue)\n"
     )
+
+    text += "\n**Stream Clients:**\n"
+    for name, active_streams, flood_wait_left in client.stream_pool.status():
+        flood_text = f", FloodWait `{flood_wait_left}s`" if flood_wait_left else ""
+        text += f"  - `{name}`: `{active_streams}` active streams{flood_text}\n"
+
+    throttled = client.rate_limiter.status()
+    if throttled:
+        text += "\n**Throttled (learned from FloodWait):**\n"
+        for name, rate, blocked_for in throttled[:10]:
+            blocked_text = f", blocked `{int(blocked_for)}s`" if blocked_for else ""
+            text += f"  - `{name}`: `{rate:.2f}`/s{blocked_text}\n"
+
+    circuits = shortener_circuit_status()
+    if circuits:
+        text += "\n**Shorteners Skipped (circuit breaker):**\n"
+        for domain, state, retry_in in circuits[:10]:
+            probe_text = f", next probe in `{int(retry_in)}s`" if retry_in else ", probing now"
+            text += f"  - `{domain}`: `{state}`{probe_text}\n"
     
     if not client.is_healthy.is_set():
         text += f"\n**Last Known Error:**\n`{client.last_health_check_error or 'No specific error logged, check console.'}`"
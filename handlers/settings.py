@@ -6,11 +6,12 @@ import logging
 import aiohttp
 import re
 import time
+from bson import ObjectId
 from pyrogram import Client, filters, enums
 from pyrogram.enums import ParseMode
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Message
 # --- LEGENDARY MODIFICATION: Import specific error for precise handling ---
-from pyrogram.errors import MessageNotModified, UserNotParticipant, ChannelPrivate, ButtonDataInvalid, ChatAdminRequired, QueryIdInvalid
+from pyrogram.errors import FloodWait, MessageNotModified, UserNotParticipant, ChannelPrivate, ButtonDataInvalid, ChatAdminRequired, QueryIdInvalid
 from pyromod.exceptions import ListenerTimeout
 from database.db import (
     get_user, update_user, add_to_list, remove_from_list,
@@ -20,12 +21,13 @@ from database.db import (
     get_posts_for_backup, delete_posts_from_channel, add_backup_channel,
     get_backup_channels, remove_backup_channel, get_post_channels
 )
-from utils.helpers import go_back_button, get_main_menu, create_post, clean_and_parse_filename, calculate_title_similarity, notify_and_remove_invalid_channel, format_bytes, PHOTO_CAPTION_LIMIT, TEXT_MESSAGE_LIMIT
-from features.shortener import validate_shortener, get_shortlink
-from features.poster import get_poster
+from utils.title_cluster import TitleClusterer
+from util.http import get_session
+from utils.helpers import go_back_button, get_main_menu, create_post, parse_filenames, calculate_title_similarity, notify_and_remove_invalid_channel, format_bytes, PHOTO_CAPTION_LIMIT, TEXT_MESSAGE_LIMIT
+from features.shortener import validate_shortener, shorten_links
+from features.poster import get_poster, send_poster
 from config import Config
 from collections import defaultdict
-from thefuzz import fuzz
 
 logger = logging.getLogger(__name__)
 ACTIVE_BACKUP_TASKS = {} # Changed to a dict to store cancel events
@@ -283,11 +285,13 @@ async def toggle_poster_handler(client, query):
     await safe_edit_message(query, text=text, reply_markup=markup)
 
 # --- LEGENDARY MODIFICATION: Corrected link generation in My Files ---
-@Client.on_callback_query(filters.regex(r"my_files_(\d+)"))
+# my_files_a<_id> is the page after that file, my_files_b<_id> the page before it; my_files_<n>
+# (older buttons used page numbers) opens the first page.
+@Client.on_callback_query(filters.regex(r"^my_files_(?:\d+|([ab])([0-9a-f]{24}))$"))
 async def my_files_handler(client, query):
     try:
         user_id = query.from_user.id
-        page = int(query.data.split("_")[-1])
+        direction, anchor = query.matches[0].groups()
         total_files = await get_user_file_count(user_id)
         files_per_page = 5
         text = f"**📂 Your Saved Files ({total_files} Total)**\n\nThis is your owner dashboard. These are direct, unshortened links to your files for your personal use.\n\n"
@@ -295,7 +299,15 @@ async def my_files_handler(client, query):
         if total_files == 0:
             text += "You have not saved any files yet."
         else:
-            files_on_page = await get_paginated_files(user_id, page, files_per_page)
+            if direction == 'a':
+                files_on_page, has_next = await get_paginated_files(user_id, files_per_page, after=ObjectId(anchor))
+                has_previous = True
+            elif direction == 'b':
+                files_on_page, has_previous = await get_paginated_files(user_id, files_per_page, before=ObjectId(anchor))
+                has_next = True
+            else:
+                files_on_page, has_next = await get_paginated_files(user_id, files_per_page)
+                has_previous = False
             if not files_on_page: 
                 text += "No more files found on this page."
             else:
@@ -306,8 +318,9 @@ async def my_files_handler(client, query):
                     text += f"**File:** `{file['file_name']}`\n**Link:** [Click Here to Get File]({link})\n\n"
         
         buttons, nav_row = [], []
-        if page > 1: nav_row.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"my_files_{page-1}"))
-        if total_files > page * files_per_page: nav_row.append(InlineKeyboardButton("Next ➡️", callback_data=f"my_files_{page+1}"))
+        if total_files and files_on_page:
+            if has_previous: nav_row.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"my_files_b{files_on_page[0]['_id']}"))
+            if has_next: nav_row.append(InlineKeyboardButton("Next ➡️", callback_data=f"my_files_a{files_on_page[-1]['_id']}"))
         if nav_row: buttons.append(nav_row)
         buttons.append([InlineKeyboardButton("🔍 Search My Files", callback_data="search_my_files")])
         buttons.append([InlineKeyboardButton("« Go Back", callback_data=f"go_back_{user_id}")])
@@ -370,13 +383,12 @@ async def search_results_paginator(client, query):
 
 # --- LEGENDARY BACKUP LOGIC (REFACTORED) ---
 
-async def create_backup_post(client, user_id, file_batch, imdb_cache):
+async def create_backup_post(client, user_id, file_batch):
     user = await get_user(user_id)
     if not user: return []
 
     media_info_list = []
-    parse_tasks = [clean_and_parse_filename(file_doc['file_name'], imdb_cache) for file_doc in file_batch]
-    parsed_results = await asyncio.gather(*parse_tasks)
+    parsed_results = await parse_filenames([file_doc['file_name'] for file_doc in file_batch])
 
     for i, info in enumerate(parsed_results):
         if info:
@@ -398,8 +410,11 @@ async def create_backup_post(client, user_id, file_batch, imdb_cache):
     
     CAPTION_LIMIT = PHOTO_CAPTION_LIMIT if post_poster else TEXT_MESSAGE_LIMIT
     
+    deep_links = [f"https://t.me/{client.me.username}?start=get_{user_id}_{info['file_unique_id']}" for info in media_info_list]
+    short_links = await shorten_links(deep_links, user_id, user)
+
     all_link_entries = []
-    for info in media_info_list:
+    for info, shortened_link in zip(media_info_list, short_links):
         display_tags_parts = []
         if info.get('episode_info'):
             numbers = re.findall(r'\d+', info['episode_info'])
@@ -412,9 +427,6 @@ async def create_backup_post(client, user_id, file_batch, imdb_cache):
         
         display_tags = " | ".join(filter(None, display_tags_parts))
         
-        deep_link = f"https://t.me/{client.me.username}?start=get_{user_id}_{info['file_unique_id']}"
-        shortened_link = await get_shortlink(deep_link, user_id)
-        
         file_size_str = format_bytes(info['file_size'])
         all_link_entries.append(f"├─📁 {display_tags or 'File'}\n│  ╰─➤ [Click Here]({shortened_link}) ({file_size_str})")
 
@@ -602,6 +614,17 @@ async def start_backup_now_handler(client, query):
      await query.answer("Backup process has been started in the background!", show_alert=False)
 
 
+BACKUP_PARSE_CHUNK = 200
+
+async def _group_backup_files(file_docs, clusterer, logical_batches):
+    """Parses a chunk of files in the parser pool and adds each one to its title group."""
+    parsed_results = await parse_filenames([file_doc['file_name'] for file_doc in file_docs])
+    for file_doc, parsed_info in zip(file_docs, parsed_results):
+        if not parsed_info:
+            logger.warning(f"Could not parse '{file_doc.get('file_name')}' for backup; filing it under Uncategorized.")
+        batch_title = (parsed_info.get("batch_title") if parsed_info else "Uncategorized") or "Uncategorized"
+        logical_batches[clusterer.assign(batch_title)].append(file_doc)
+
 # --- LEGENDARY MODIFICATION: Complete overhaul for real-time percentage dashboard ---
 async def start_backup_process(client, source_query, user_id, destination_channels):
     if user_id in ACTIVE_BACKUP_TASKS: return
@@ -609,7 +632,6 @@ async def start_backup_process(client, source_query, user_id, destination_channe
     status_msg = source_query.message
     cancel_event = asyncio.Event()
     ACTIVE_BACKUP_TASKS[user_id] = cancel_event
-    imdb_cache = {}
     
     def format_time(seconds):
         if seconds < 60: return f"{seconds:.0f}s"
@@ -635,24 +657,21 @@ async def start_backup_process(client, source_query, user_id, destination_channe
         
         file_cursor = await get_all_user_files(user_id)
         logical_batches = defaultdict(list)
+        SIMILARITY_THRESHOLD = 85
+        clusterer = TitleClusterer(SIMILARITY_THRESHOLD)
         processed_count = 0
         
+        pending_docs = []
         async for file_doc in file_cursor:
             if cancel_event.is_set(): raise asyncio.CancelledError("Backup cancelled by user.")
             
-            try:
-                parsed_info = await clean_and_parse_filename(file_doc['file_name'], imdb_cache)
-                batch_title = (parsed_info.get("batch_title") if parsed_info else "Uncategorized") or "Uncategorized"
-                SIMILARITY_THRESHOLD = 85
-                best_match_key = max(logical_batches.keys(), key=lambda k: fuzz.token_set_ratio(batch_title, k), default=None)
-                if best_match_key and fuzz.token_set_ratio(batch_title, best_match_key) > SIMILARITY_THRESHOLD:
-                    logical_batches[best_match_key].append(file_doc)
-                else:
-                    logical_batches[batch_title].append(file_doc)
-            except Exception as e:
-                logger.error(f"Skipping file in backup due to parsing error: {file_doc.get('file_name')}, Error: {e}")
-            
-            processed_count += 1
+            # Files are parsed in chunks so the CPU work runs in the parser pool, off the event loop.
+            pending_docs.append(file_doc)
+            if len(pending_docs) < BACKUP_PARSE_CHUNK:
+                continue
+            await _group_backup_files(pending_docs, clusterer, logical_batches)
+            processed_count += len(pending_docs)
+            pending_docs = []
             
             # Throttled update
             now = time.time()
@@ -667,6 +686,10 @@ async def start_backup_process(client, source_query, user_id, destination_channe
                 )
                 last_update_time = now
 
+        if pending_docs:
+            await _group_backup_files(pending_docs, clusterer, logical_batches)
+            processed_count += len(pending_docs)
+
         total_batches = len(logical_batches)
 
         # --- PHASE 2 & 3: POSTING ---
@@ -690,17 +713,20 @@ async def start_backup_process(client, source_query, user_id, destination_channe
                 last_update_time = now
             
             try:
-                posts_to_send = await create_backup_post(client, user_id, files_in_batch, imdb_cache)
+                posts_to_send = await create_backup_post(client, user_id, files_in_batch)
                 for dest_ch_id in destination_channels:
                     for poster, caption, footer in posts_to_send:
                         if cancel_event.is_set(): raise asyncio.CancelledError("Backup cancelled by user.")
                         try:
+                            await client.rate_limiter.acquire(dest_ch_id, "send")
                             if poster:
-                                await client.send_photo(dest_ch_id, photo=poster, caption=caption, reply_markup=footer)
+                                await send_poster(client.send_photo, poster, chat_id=dest_ch_id, caption=caption, reply_markup=footer)
                             else:
                                 await client.send_message(dest_ch_id, caption, reply_markup=footer, disable_web_page_preview=True)
-                            await asyncio.sleep(2.5)
+                            client.rate_limiter.report_success(dest_ch_id, "send")
                         except Exception as post_err:
+                            if isinstance(post_err, FloodWait):
+                                client.rate_limiter.report_flood_wait(dest_ch_id, "send", post_err.value)
                             logger.error(f"Failed to post to backup channel {dest_ch_id}. Error: {post_err}")
                             await client.send_message(user_id, f"Skipped posting to `{dest_ch_id}` during backup due to an error: `{post_err}`")
                             continue
@@ -718,7 +744,6 @@ async def start_backup_process(client, source_query, user_id, destination_channe
         await safe_edit_message(status_msg, f"A major error occurred: {e}", reply_markup=go_back_button(user_id))
     finally:
         ACTIVE_BACKUP_TASKS.pop(user_id, None)
-        imdb_cache.clear()
 
 
 @Client.on_callback_query(filters.regex(r"cancel_backup_"))
@@ -792,10 +817,9 @@ async def add_footer_handler(client, query):
         await prompt_msg.edit_text(f"⏳ **Validating URL...**\n`{button_url}`")
         is_valid = False
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.head(button_url, timeout=5, allow_redirects=True) as resp:
-                    if resp.status in range(200, 400):
-                        is_valid = True
+            async with get_session().head(button_url, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=True) as resp:
+                if resp.status in range(200, 400):
+                    is_valid = True
         except Exception as e:
             logger.error(f"URL validation failed for footer button: {e}")
 
@@ -1042,9 +1066,8 @@ async def fsub_and_download_logic(client, query):
             
             is_valid = False
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.head(url_to_check, timeout=5, allow_redirects=True) as resp:
-                        if resp.status in range(200, 400): is_valid = True
+                async with get_session().head(url_to_check, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=True) as resp:
+                    if resp.status in range(200, 400): is_valid = True
             except Exception as e: logger.error(f"URL validation failed for {url_to_check}: {e}")
 
             if is_valid:
@@ -1,16 +1,29 @@
 # server/stream_routes.py
 
+import asyncio
 import logging
+import math
+import re
 from aiohttp import web
 from aiohttp.client_exceptions import ClientConnectionResetError
-from util.render_template import render_player_page
+from util.render_template import get_player_page
 from util.custom_dl import ByteStreamer
-from util.file_properties import get_media_from_message # Import helper
+from util.metrics import render_metrics, ACTIVE_STREAMS, BYTES_SERVED
+from config import Config
 from pyrogram.errors import RPCError
 
 logger = logging.getLogger(__name__)
 routes = web.RouteTableDef()
 
+# Size of one upload.GetFile part. Telegram requires offsets aligned to this.
+CHUNK_SIZE = 1024 * 1024
+# A single byte range; multi-range requests don't match and are served in full.
+RANGE_RE = re.compile(r"^\s*bytes=(\d*)-(\d*)\s*$")
+
+
+class IncompleteRunError(Exception):
+    """Telegram stopped before a run of parts was fully written to the client."""
+
 
 @routes.get("/", allow_head=True)
 async def root_route_handler(request):
@@ -19,6 +32,14 @@ async def root_route_handler(request):
         "bot_status": "connected"
     })
 
+@routes.get("/metrics")
+async def metrics_handler(request):
+    if Config.METRICS_TOKEN:
+        supplied = request.query.get("token") or request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if supplied != Config.METRICS_TOKEN:
+            return web.Response(status=401, text="Unauthorized.")
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8", headers={"Cache-Control": "no-store"})
+
 @routes.get("/favicon.ico", allow_head=True)
 async def favicon_handler(request):
     return web.Response(status=204)
@@ -29,51 +50,198 @@ async def watch_handler(request):
     try:
         message_id = int(request.match_info['message_id'])
         bot = request.app['bot']
-        content = await render_player_page(bot, message_id)
-        return web.Response(text=content, content_type="text/html")
+        content, etag = get_player_page(bot, message_id)
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=content, content_type="text/html", headers=headers)
     except Exception as e:
         logger.error(f"Error in watch_handler: {e}", exc_info=True)
         return web.Response(text="<h1>500 - Internal Server Error</h1><p>Could not render the page.</p>", content_type="text/html", status=500)
 
-# --- LEGENDARY MODIFICATION: Refactored to use Message object ---
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header matches the ETag (weak comparison, as RFC 9110 asks for)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def parse_range_header(range_header: str, file_size: int):
+    """
+    Parses a single 'bytes=' range (including open-ended 'N-' and suffix '-N' forms).
+    Returns (from_bytes, until_bytes), None when the header should be ignored
+    (multiple ranges, which aren't served, and invalid ranges such as 'bytes=5-2',
+    per RFC 9110 section 14.2),
+    or raises web.HTTPRequestRangeNotSatisfiable when a valid range starts past
+    the end of the file.
+    """
+    match = RANGE_RE.match(range_header or "")
+    if not match:
+        return None
+    start, end = match.group(1), match.group(2)
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range: the last N bytes of the file.
+        suffix_length = int(end)
+        if suffix_length == 0:
+            raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{file_size}"})
+        from_bytes = max(file_size - suffix_length, 0)
+        until_bytes = file_size - 1
+    else:
+        from_bytes = int(start)
+        until_bytes = int(end) if end else file_size - 1
+        if until_bytes < from_bytes:
+            return None
+        until_bytes = min(until_bytes, file_size - 1)
+
+    if from_bytes >= file_size:
+        raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{file_size}"})
+    return from_bytes, until_bytes
+
+
+async def media_streamer(request, message_id: int, disposition: str):
+    """
+    Serves the requested byte range of a stored file, mapping it onto aligned
+    upload.GetFile parts so seeks and resumed downloads only fetch what is needed.
+    Parts already in the local chunk cache never touch Telegram, and the rest are
+    fetched by the least-loaded client of the stream pool.
+    """
+    bot = request.app['bot']
+    pool = bot.stream_pool
+    async with pool.acquire() as client:
+        streamer = ByteStreamer(client, pool)
+        properties = await streamer.get_file_properties(message_id)
+
+        file_size = properties.file_size
+        file_name = properties.file_name
+        mime_type = properties.mime_type or "application/octet-stream"
+        if disposition == "attachment":
+            mime_type = "application/octet-stream"
+
+        byte_range = parse_range_header(request.headers.get("Range"), file_size) if file_size else None
+        if byte_range:
+            from_bytes, until_bytes = byte_range
+        else:
+            from_bytes, until_bytes = 0, file_size - 1
+
+        req_length = until_bytes - from_bytes + 1 if file_size else 0
+        headers = {
+            "Content-Type": mime_type,
+            "Content-Length": str(req_length),
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f'{disposition}; filename="{file_name}"'
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+
+        res = web.StreamResponse(status=206 if byte_range else 200, headers=headers)
+        writer = await res.prepare(request)
+        if request.method == "HEAD" or req_length == 0:
+            return res
+
+        ACTIVE_STREAMS.inc(disposition=disposition)
+        try:
+            await write_byte_range(request, res, writer, streamer, properties, message_id, from_bytes, until_bytes)
+        # --- LEGENDARY FIX v2.0: The Unbreakable Shield ---
+        # This now catches ALL known disconnection errors for 100% stability.
+        except (ClientConnectionResetError, ConnectionResetError, BrokenPipeError, ConnectionError):
+            logger.warning(f"Client disconnected for {disposition} of message_id {message_id}.")
+        except IncompleteRunError as e:
+            # Whatever follows would land at the wrong offset. Dropping the connection
+            # leaves the client with a visibly truncated body it can resume with a Range.
+            logger.error(f"Aborting {disposition} of message_id {message_id}: {e}")
+            if request.transport is not None:
+                request.transport.abort()
+        finally:
+            ACTIVE_STREAMS.dec(disposition=disposition)
+
+        return res
+
+
+def get_part_range(from_bytes: int, until_bytes: int):
+    """Maps an inclusive byte range onto (offset, first_part_cut, last_part_cut, part_count) of aligned parts."""
+    offset = from_bytes - (from_bytes % CHUNK_SIZE)
+    first_part_cut = from_bytes - offset
+    last_part_cut = until_bytes % CHUNK_SIZE + 1
+    part_count = math.ceil((until_bytes + 1) / CHUNK_SIZE) - offset // CHUNK_SIZE
+    return offset, first_part_cut, last_part_cut, part_count
+
+
+async def stream_from_telegram(res, streamer, properties, message_id: int, from_bytes: int, until_bytes: int):
+    body = streamer.yield_file(
+        properties.file_id, *get_part_range(from_bytes, until_bytes), CHUNK_SIZE,
+        file_unique_id=properties.file_unique_id, message_id=message_id
+    )
+    written = 0
+    try:
+        async for chunk in body:
+            await res.write(chunk)
+            written += len(chunk)
+            BYTES_SERVED.inc(len(chunk), source="telegram")
+    finally:
+        await body.aclose()
+    expected = until_bytes - from_bytes + 1
+    if written != expected:
+        raise IncompleteRunError(f"bytes {from_bytes}-{until_bytes} stopped after {written} of {expected} bytes")
+
+
+async def sendfile_cached_part(request, writer, path: str, start: int, count: int) -> bool:
+    """Sends a slice of a cached part with zero-copy sendfile. Returns False if the part has vanished."""
+    transport = request.transport
+    if transport is None:
+        raise ConnectionResetError("Connection lost")
+    try:
+        part_file = open(path, 'rb')
+    except OSError:
+        return False
+    with part_file:
+        await writer.drain()
+        sent = await asyncio.get_running_loop().sendfile(transport, part_file, start, count)
+    BYTES_SERVED.inc(sent, source="cache")
+    if sent != count:
+        raise IncompleteRunError(f"cached part {path} ended after {sent} of {count} bytes")
+    return True
+
+
+async def write_byte_range(request, res, writer, streamer, properties, message_id: int, from_bytes: int, until_bytes: int):
+    """
+    Writes the byte range part by part: cached parts are sent from disk and
+    each run of uncached parts is fetched from Telegram (and cached on the way).
+    """
+    cache = streamer.cache
+    file_unique_id = properties.file_unique_id
+    if not cache or not cache.enabled:
+        return await stream_from_telegram(res, streamer, properties, message_id, from_bytes, until_bytes)
+
+    part, last_part = from_bytes // CHUNK_SIZE, until_bytes // CHUNK_SIZE
+    while part <= last_part:
+        run_start = max(from_bytes, part * CHUNK_SIZE)
+        path = cache.get(file_unique_id, part)
+        if path:
+            run_end = min(until_bytes, (part + 1) * CHUNK_SIZE - 1)
+            if not await sendfile_cached_part(request, writer, path, run_start - part * CHUNK_SIZE, run_end - run_start + 1):
+                cache.discard(file_unique_id, part)
+                await stream_from_telegram(res, streamer, properties, message_id, run_start, run_end)
+            part += 1
+            continue
+
+        run_last = part
+        while run_last < last_part and not cache.has(file_unique_id, run_last + 1):
+            run_last += 1
+        run_end = min(until_bytes, (run_last + 1) * CHUNK_SIZE - 1)
+        await stream_from_telegram(res, streamer, properties, message_id, run_start, run_end)
+        part = run_last + 1
+
+
 @routes.get(r"/stream/{message_id:\d+}")
 async def stream_handler(request):
     try:
         message_id = int(request.match_info['message_id'])
-        bot = request.app['bot']
-        streamer = ByteStreamer(bot)
-        
-        # 1. Fetch the full message object
-        message = await streamer.get_file_properties(message_id)
-        media = get_media_from_message(message)
-        
-        file_size = media.file_size
-        file_name = media.file_name
-
-        res = web.StreamResponse(
-            headers={
-                "Content-Type": media.mime_type,
-                "Content-Length": str(file_size),
-                "Accept-Ranges": "bytes",
-                "Content-Range": f"bytes 0-{file_size-1}/{file_size}",
-                "Content-Disposition": f'inline; filename="{file_name}"'
-            }
-        )
-        await res.prepare(request)
-
-        # 2. Pass the message object directly to stream_media
-        async for chunk in bot.stream_media(message, limit=1024*1024):
-            # --- LEGENDARY FIX v2.0: The Unbreakable Shield ---
-            # This now catches ALL known disconnection errors for 100% stability.
-            try:
-                await res.write(chunk)
-            except (ClientConnectionResetError, ConnectionResetError, BrokenPipeError, ConnectionError):
-                logger.warning(f"Client disconnected for stream of message_id {message_id}.")
-                # Stop sending data and exit cleanly
-                break
-        
-        return res
-
+        return await media_streamer(request, message_id, "inline")
+    except web.HTTPException:
+        raise
     except RPCError as e:
         logger.error(f"Telegram RPCError in stream_handler: {e}", exc_info=True)
         return web.Response(status=404, text="File not accessible on Telegram.")
@@ -86,35 +254,9 @@ async def stream_handler(request):
 async def download_handler(request):
     try:
         message_id = int(request.match_info['message_id'])
-        bot = request.app['bot']
-        streamer = ByteStreamer(bot)
-        
-        # 1. Fetch the full message object
-        message = await streamer.get_file_properties(message_id)
-        media = get_media_from_message(message)
-
-        res = web.StreamResponse(
-            headers={
-                "Content-Type": "application/octet-stream",
-                "Content-Length": str(media.file_size),
-                "Content-Disposition": f'attachment; filename="{media.file_name}"'
-            }
-        )
-        await res.prepare(request)
-        
-        # 2. Pass the message object directly to stream_media
-        async for chunk in bot.stream_media(message, limit=1024*1024):
-            # --- LEGENDARY FIX v2.0: The Unbreakable Shield ---
-            # This now catches ALL known disconnection errors for 100% stability.
-            try:
-                await res.write(chunk)
-            except (ClientConnectionResetError, ConnectionResetError, BrokenPipeError, ConnectionError):
-                logger.warning(f"Client disconnected for download of message_id {message_id}.")
-                # Stop sending data and exit cleanly
-                break
-
-        return res
-        
+        return await media_streamer(request, message_id, "attachment")
+    except web.HTTPException:
+        raise
     except RPCError as e:
         logger.error(f"Telegram RPCError in download_handler: {e}", exc_info=True)
         return web.Response(status=404, text="File not accessible on Telegram.")
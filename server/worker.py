@@ -0,0 +1,88 @@
+# server/worker.py
+
+import asyncio
+import logging
+import os
+from aiohttp import web
+from pyrogram import Client
+from config import Config
+from server import web_server
+from util.chunk_cache import ChunkCache
+from util.media_sessions import MediaSessionManager
+from util.client_pool import StreamClientPool
+from util import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StreamWorkerClient(Client):
+    """
+    A minimal MTProto client for a streaming worker process. It never receives
+    updates and carries only the attributes the stream routes rely on.
+    """
+
+    def __init__(self, index: int, bot_token: str):
+        super().__init__(
+            f"stream_worker_{index}", api_id=Config.API_ID, api_hash=Config.API_HASH,
+            bot_token=bot_token, in_memory=True, no_updates=True
+        )
+        self.app_url = Config.APP_URL.rstrip('/')
+        self.owner_db_channel = Config.OWNER_DB_CHANNEL
+        self.stream_channel_id = None
+        # Each worker owns a slice of the cache budget in its own directory, so
+        # evictions in one process never delete parts another process has indexed.
+        self.chunk_cache = ChunkCache(
+            os.path.join(Config.CHUNK_CACHE_DIR, f"worker_{index}"),
+            Config.CHUNK_CACHE_MAX_MB * 1024 * 1024 // max(1, Config.STREAM_WORKERS)
+        )
+        self.media_session_manager = MediaSessionManager(self)
+        self.stream_pool = StreamClientPool(self)
+
+
+def worker_tokens(index: int, workers: int):
+    """
+    Bot tokens for stream worker `index`. The helper tokens are split between the
+    workers so no token is logged in twice; only a worker left without a helper
+    shares the main BOT_TOKEN with the bot process.
+    """
+    return Config.MULTI_BOT_TOKENS[index::max(1, workers)] or [Config.BOT_TOKEN]
+
+
+async def serve_stream_worker(index: int, port: int):
+    tokens = worker_tokens(index, Config.STREAM_WORKERS)
+    client = StreamWorkerClient(index, tokens[0])
+    metrics.CONST_LABELS["worker"] = str(index)
+    asyncio.create_task(metrics.monitor_event_loop_lag())
+    await client.start()
+    if len(tokens) > 1:
+        await client.stream_pool.start(tokens[1:])
+    client.media_session_manager.start()
+    asyncio.create_task(client.media_session_manager.prewarm([await client.storage.dc_id()]))
+
+    runner = web.AppRunner(await web_server(client))
+    await runner.setup()
+    # Every worker binds the same port; the kernel spreads connections across them.
+    site = web.TCPSite(runner, "0.0.0.0", port, reuse_port=True)
+    await site.start()
+    logger.info(f"Stream worker #{index} serving on 0.0.0.0:{port} as @{(await client.get_me()).username}.")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await client.stream_pool.stop()
+        await client.media_session_manager.stop()
+        await client.stop()
+
+
+def run_stream_worker(index: int, port: int):
+    """Process entry point of one streaming worker."""
+    logging.basicConfig(
+        level=logging.INFO, format=f"%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler("bot.log"), logging.StreamHandler()], force=True
+    )
+    logging.getLogger("pyrogram").setLevel(logging.WARNING)
+    try:
+        asyncio.run(serve_stream_worker(index, port))
+    except KeyboardInterrupt:
+        pass
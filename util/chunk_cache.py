@@ -0,0 +1,117 @@
+# util/chunk_cache.py
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkCache:
+    """
+    Size-bounded LRU cache of Telegram GetFile parts on local disk.
+
+    Parts are keyed by (file_unique_id, part_index) and stored untrimmed as
+    '<root>/<file_unique_id>/<part_index>', one plain file per part, so cache
+    hits can be handed straight to sendfile. The in-memory index is rebuilt
+    from disk on startup, oldest mtime first.
+    """
+
+    def __init__(self, root: str, max_bytes: int, part_size: int = 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.part_size = part_size
+        self.entries = OrderedDict()  # (file_unique_id, part_index) -> size in bytes
+        self.total_bytes = 0
+        self.pending = set()
+        if self.enabled:
+            os.makedirs(self.root, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _load_index(self):
+        found = []
+        for file_dir in os.scandir(self.root):
+            if not file_dir.is_dir():
+                continue
+            for part in os.scandir(file_dir.path):
+                if not part.name.isdigit():
+                    # Leftover temp file from an interrupted write.
+                    try: os.remove(part.path)
+                    except OSError: pass
+                    continue
+                stat = part.stat()
+                found.append((stat.st_mtime, (file_dir.name, int(part.name)), stat.st_size))
+
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        logger.info(f"Chunk cache ready: {len(self.entries)} parts, {self.total_bytes / (1024 * 1024):.1f} MiB in '{self.root}'.")
+
+    def part_path(self, file_unique_id: str, part_index: int) -> str:
+        return os.path.join(self.root, file_unique_id, str(part_index))
+
+    def has(self, file_unique_id: str, part_index: int) -> bool:
+        return (file_unique_id, part_index) in self.entries
+
+    def get(self, file_unique_id: str, part_index: int):
+        """Returns the path of a cached part and marks it as recently used, or None."""
+        key = (file_unique_id, part_index)
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.part_path(file_unique_id, part_index)
+
+    def discard(self, file_unique_id: str, part_index: int):
+        size = self.entries.pop((file_unique_id, part_index), None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def put(self, file_unique_id: str, part_index: int, data: bytes):
+        """Schedules a part to be written to disk without blocking the caller."""
+        if not self.enabled or not data or len(data) > self.max_bytes:
+            return
+        key = (file_unique_id, part_index)
+        if key in self.entries or key in self.pending:
+            return
+        self.pending.add(key)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self._write_part, file_unique_id, part_index, data)
+        future.add_done_callback(lambda f, u=file_unique_id, i=part_index, s=len(data): self._on_written(f, u, i, s))
+
+    def _write_part(self, file_unique_id: str, part_index: int, data: bytes):
+        path = self.part_path(file_unique_id, part_index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _on_written(self, future, file_unique_id: str, part_index: int, size: int):
+        self.pending.discard((file_unique_id, part_index))
+        if future.exception():
+            logger.warning(f"Could not cache part {part_index} of '{file_unique_id}': {future.exception()}")
+            return
+        key = (file_unique_id, part_index)
+        if key not in self.entries:
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            (file_unique_id, part_index), size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.part_path(file_unique_id, part_index))
+            except OSError:
+                pass
+            try:
+                os.rmdir(os.path.join(self.root, file_unique_id))
+            except OSError:
+                pass
@@ -0,0 +1,78 @@
+# util/circuit_breaker.py
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a service that keeps failing.
+
+    Closed: calls go through and consecutive failures are counted. After
+    `failure_threshold` of them the breaker opens: calls are skipped, and a
+    background task waits `reset_timeout` seconds and then runs `probe` (half-open).
+    A successful probe closes the breaker; a failed one keeps it open and doubles
+    the wait, up to `max_reset_timeout`.
+    """
+
+    def __init__(self, name: str, probe, failure_threshold: int = 3, reset_timeout: float = 30, max_reset_timeout: float = 600):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.current_timeout = reset_timeout
+        self.retry_at = 0.0
+        self._probe_task = None
+
+    def allow(self) -> bool:
+        return self.state == CLOSED
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self):
+        if self.state != CLOSED:
+            return
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.retry_at = time.monotonic() + self.current_timeout
+        logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures. Next probe in {self.current_timeout:.0f}s.")
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        while self.state != CLOSED:
+            await asyncio.sleep(max(0.0, self.retry_at - time.monotonic()))
+            self.state = HALF_OPEN
+            try:
+                healthy = await self.probe()
+            except Exception as e:
+                logger.debug(f"Probe of {self.name} failed: {e}")
+                healthy = False
+            if healthy:
+                self.state = CLOSED
+                self.failures = 0
+                self.current_timeout = self.reset_timeout
+                logger.info(f"Circuit for {self.name} closed again; the probe succeeded.")
+            else:
+                self.current_timeout = min(self.max_reset_timeout, self.current_timeout * 2)
+                self.state = OPEN
+                self.retry_at = time.monotonic() + self.current_timeout
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self.retry_at - time.monotonic()) if self.state == OPEN else 0.0
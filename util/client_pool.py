@@ -0,0 +1,84 @@
+# util/client_pool.py
+
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pyrogram import Client
+from config import Config
+from util.media_sessions import MediaSessionManager
+
+logger = logging.getLogger(__name__)
+
+
+class StreamClientPool:
+    """
+    Spreads GetFile traffic over the main bot and any helper bot tokens.
+
+    Helper clients never receive updates; they only fetch file parts. Each stream
+    is pinned to the least-loaded client for its whole lifetime, and clients that
+    recently hit a FloodWait are skipped until the wait is over.
+    """
+
+    def __init__(self, main_client: Client):
+        self.main_client = main_client
+        self.clients = [main_client]
+        self.active_streams = defaultdict(int)  # Client -> streams currently served
+        self.flood_until = {}  # Client -> monotonic time the FloodWait ends
+
+    async def start(self, tokens):
+        for i, token in enumerate(tokens, start=1):
+            client = Client(
+                f"stream_helper_{i}", api_id=Config.API_ID, api_hash=Config.API_HASH,
+                bot_token=token, in_memory=True, no_updates=True
+            )
+            try:
+                await client.start()
+            except Exception as e:
+                logger.error(f"Could not start stream helper #{i}: {e}")
+                continue
+            # Files are always copied into the Owner DB Channel, so helpers read from there.
+            client.owner_db_channel = self.main_client.owner_db_channel
+            client.stream_channel_id = None
+            client.chunk_cache = getattr(self.main_client, 'chunk_cache', None)
+            client.media_session_manager = MediaSessionManager(client)
+            client.media_session_manager.start()
+            self.clients.append(client)
+            logger.info(f"Stream helper #{i} started as @{(await client.get_me()).username}.")
+        logger.info(f"Streaming with {len(self.clients)} client(s).")
+
+    async def stop(self):
+        for client in self.clients[1:]:
+            try:
+                await client.media_session_manager.stop()
+                await client.stop()
+            except Exception as e:
+                logger.warning(f"Error while stopping stream helper {client.name}: {e}")
+        self.clients = [self.main_client]
+
+    def pick(self) -> Client:
+        now = time.monotonic()
+        available = [c for c in self.clients if self.flood_until.get(c, 0) <= now]
+        if not available:
+            # Everyone is throttled; take whoever is free first.
+            return min(self.clients, key=lambda c: self.flood_until.get(c, 0))
+        return min(available, key=lambda c: self.active_streams[c])
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Yields the client a new stream should use and counts it as active meanwhile."""
+        client = self.pick()
+        self.active_streams[client] += 1
+        try:
+            yield client
+        finally:
+            self.active_streams[client] -= 1
+
+    def report_flood_wait(self, client: Client, seconds: int):
+        self.flood_until[client] = max(self.flood_until.get(client, 0), time.monotonic() + seconds)
+        logger.warning(f"Stream client {client.name} hit a FloodWait of {seconds}s; routing new streams elsewhere.")
+
+    def status(self):
+        """Returns (name, active streams, seconds of FloodWait left) for every client."""
+        now = time.monotonic()
+        return [(c.name, self.active_streams[c], max(0, int(self.flood_until.get(c, 0) - now))) for c in self.clients]
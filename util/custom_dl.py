@@ -3,60 +3,38 @@
 import asyncio
 import logging
 import math
+import time
+from collections import deque
 from typing import Union
 from pyrogram import Client, raw, utils
 from pyrogram.file_id import FileId
-from pyrogram.session import Session, Auth
-from pyrogram.errors import AuthBytesInvalid
-# --- LEGENDARY MODIFICATION: Import the renamed function ---
-from util.file_properties import get_message_with_properties, FileIdError
+from pyrogram.errors import FileReferenceExpired, FloodWait
+from config import Config
+from util.file_properties import get_file_properties, FileProperties, FileIdError
+from util.media_sessions import get_session_manager
+from util.metrics import GETFILE_SECONDS, FLOOD_WAITS, FLOOD_WAIT_SECONDS
 
 logger = logging.getLogger(__name__)
 
 class ByteStreamer:
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, pool=None):
         self.client: Client = client
+        self.pool = pool
+        self.cache = getattr(client, 'chunk_cache', None)
+        self.sessions = get_session_manager(client)
 
-    async def get_file_properties(self, message_id: int):
+    async def get_file_properties(self, message_id: int, refresh: bool = False) -> FileProperties:
         """
-        This is now a wrapper that returns the full message object.
-        The name is kept for backward compatibility in other parts of the code,
-        but it now fetches the message.
+        Returns the decoded FileId, size, mime type and name of a stored file.
+        Served from the in-process metadata cache, so repeated seeks and probes
+        of the same file skip the get_messages round trip.
         """
         try:
-            # --- LEGENDARY MODIFICATION: Call the renamed function ---
-            return await get_message_with_properties(self.client, message_id)
+            return await get_file_properties(self.client, message_id, refresh=refresh)
         except (ValueError, FileIdError) as e:
             logger.error(f"Failed to get file properties for message_id {message_id}: {e}")
             raise
 
-    async def generate_media_session(self, client: Client, dc_id: int):
-        session = client.media_sessions.get(dc_id)
-
-        if session is None:
-            session = Session(
-                client, dc_id, await Auth(client, dc_id, await client.storage.test_mode()).create(),
-                await client.storage.test_mode(), is_media=True
-            )
-            await session.start()
-
-            for i in range(3):
-                exported_auth = await client.invoke(
-                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
-                )
-                try:
-                    await session.invoke(
-                        raw.functions.auth.ImportAuthorization(
-                            id=exported_auth.id,
-                            bytes=exported_auth.bytes
-                        )
-                    )
-                    break
-                except AuthBytesInvalid:
-                    continue
-            client.media_sessions[dc_id] = session
-        return session
-
     @staticmethod
     def get_location(file_id: FileId):
         return raw.types.InputDocumentFileLocation(
@@ -66,38 +44,115 @@ class ByteStreamer:
             thumb_size=""
         )
 
-    async def yield_file(self, file_id: FileId, offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int):
-        media_session = await self.generate_media_session(self.client, file_id.dc_id)
+    async def _fetch_part(self, dc_id: int, location, offset: int, chunk_size: int, retries: int = 5):
+        """
+        Fetches a single GetFile part, retrying on timeouts. Each attempt borrows the
+        least-busy media session of the DC. Returns None on failure.
+        """
+        for attempt in range(retries):
+            try:
+                async with self.sessions.session(dc_id) as media_session:
+                    started = time.perf_counter()
+                    chunk = await media_session.invoke(
+                        raw.functions.upload.GetFile(
+                            location=location,
+                            offset=offset,
+                            limit=chunk_size
+                        ),
+                        retries=0
+                    )
+                    GETFILE_SECONDS.observe(time.perf_counter() - started, dc=dc_id)
+            except asyncio.TimeoutError:
+                logger.warning(f"Timeout error while fetching chunk at offset {offset}, retrying... (Attempt {attempt + 1}/{retries})")
+                await asyncio.sleep(1)
+                continue
+            except FloodWait as e:
+                FLOOD_WAITS.inc(source="getfile")
+                FLOOD_WAIT_SECONDS.observe(e.value)
+                # Steer new streams away from this client; this one has to wait it out.
+                if self.pool:
+                    self.pool.report_flood_wait(self.client, e.value)
+                await asyncio.sleep(e.value)
+                continue
+            if isinstance(chunk, raw.types.upload.File):
+                return chunk.bytes
+            logger.warning(f"Received unexpected type from GetFile: {type(chunk)}")
+            return None
+        logger.error(f"Giving up on chunk at offset {offset} after {retries} timeouts.")
+        return None
+
+    async def yield_file(self, file_id: FileId, offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int, prefetch: int = None, file_unique_id: str = None, message_id: int = None):
+        """
+        Yields the requested parts in order while keeping up to `prefetch` GetFile
+        requests in flight. The pending deque doubles as the reorder buffer, and new
+        parts are only requested as the consumer pulls, so a slow client never holds
+        more than `prefetch` parts in memory. When `file_unique_id` is given, fetched
+        parts are also written to the client's chunk cache. When `message_id` is given,
+        an expired file_reference is refreshed once and the part is retried.
+        """
         location = self.get_location(file_id)
+        prefetch = max(1, prefetch or Config.STREAM_PREFETCH_PARTS)
+
+        first_part_index = offset // chunk_size
+        cache = self.cache if self.cache and file_unique_id and chunk_size == self.cache.part_size else None
+
+        pending = deque()
+        next_part, next_offset = 1, offset
+
+        refresh_lock = asyncio.Lock()
+
+        async def fetch(part_offset: int):
+            nonlocal location
+            while True:
+                used_location = location
+                try:
+                    return await self._fetch_part(file_id.dc_id, used_location, part_offset, chunk_size)
+                except FileReferenceExpired:
+                    if not message_id:
+                        raise
+                    async with refresh_lock:
+                        if location is used_location:
+                            logger.info(f"File reference expired for message_id {message_id}, refreshing...")
+                            properties = await self.get_file_properties(message_id, refresh=True)
+                            if self.get_location(properties.file_id).file_reference == used_location.file_reference:
+                                raise
+                            location = self.get_location(properties.file_id)
+
+        def schedule():
+            nonlocal next_part, next_offset
+            while next_part <= part_count and len(pending) < prefetch:
+                pending.append(asyncio.ensure_future(fetch(next_offset)))
+                next_part += 1
+                next_offset += chunk_size
 
         current_part = 1
-        while current_part <= part_count:
-            try:
-                chunk = await media_session.invoke(
-                    raw.functions.upload.GetFile(
-                        location=location,
-                        offset=offset,
-                        limit=chunk_size
-                    ),
-                    retries=0
-                )
-                if isinstance(chunk, raw.types.upload.File):
-                    if current_part == 1 and part_count > 1:
-                        yield chunk.bytes[first_part_cut:]
-                    elif current_part == part_count and part_count > 1:
-                        yield chunk.bytes[:last_part_cut]
-                    else:
-                        yield chunk.bytes
-                    
-                    offset += chunk_size
-                    current_part += 1
-                else:
-                    logger.warning(f"Received unexpected type from GetFile: {type(chunk)}")
+        try:
+            schedule()
+            while pending:
+                try:
+                    chunk = await pending.popleft()
+                except Exception as e:
+                    logger.error(f"Error yielding file chunk: {e}", exc_info=True)
                     break
-            except asyncio.TimeoutError:
-                logger.warning("Timeout error while fetching chunk, retrying...")
-                await asyncio.sleep(1) 
-                continue
-            except Exception as e:
-                logger.error(f"Error yielding file chunk: {e}", exc_info=True)
-                break
+                if chunk is None:
+                    break
+                if cache:
+                    cache.put(file_unique_id, first_part_index + current_part - 1, chunk)
+
+                if part_count == 1:
+                    yield chunk[first_part_cut:last_part_cut]
+                elif current_part == 1:
+                    yield chunk[first_part_cut:]
+                elif current_part == part_count:
+                    yield chunk[:last_part_cut]
+                else:
+                    yield chunk
+
+                current_part += 1
+                schedule()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Wait for the cancelled fetches to unwind, so they release their media
+            # sessions now and their exceptions are retrieved rather than logged as lost.
+            await asyncio.gather(*pending, return_exceptions=True)
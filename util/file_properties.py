@@ -4,10 +4,28 @@ from pyrogram import Client
 from typing import Any
 from pyrogram.types import Message
 from pyrogram.file_id import FileId
+from utils.cache import TTLCache
 
 class FileIdError(Exception):
     pass
 
+
+class FileProperties:
+    """Decoded media details needed to stream a stored file without refetching its message."""
+    __slots__ = ("file_id", "file_unique_id", "file_size", "mime_type", "file_name")
+
+    def __init__(self, file_id: FileId, file_unique_id: str, file_size: int, mime_type: str, file_name: str):
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.file_size = file_size
+        self.mime_type = mime_type
+        self.file_name = file_name
+
+
+# Keyed by (client name, channel id, message id). Stored files never change, so entries
+# only go stale when Telegram rotates the file_reference, which forces a refresh.
+_properties_cache = TTLCache(maxsize=10000, ttl=6 * 3600)
+
 def get_media_from_message(message: "Message") -> Any:
     media_types = (
         "audio", "document", "photo", "sticker", "animation", 
@@ -35,3 +53,28 @@ async def get_message_with_properties(client: Client, message_id: int) -> Messag
         raise FileIdError("Message not found or has no media.")
         
     return message
+
+
+async def get_file_properties(client: Client, message_id: int, refresh: bool = False) -> FileProperties:
+    """
+    Returns the cached FileProperties of a stored message, fetching the message only
+    on a cache miss or when `refresh` is set (e.g. after FILE_REFERENCE_EXPIRED).
+    """
+    stream_channel = client.stream_channel_id or client.owner_db_channel
+    cache_key = (client.name, stream_channel, message_id)
+    if not refresh:
+        properties = _properties_cache.get(cache_key)
+        if properties:
+            return properties
+
+    message = await get_message_with_properties(client, message_id)
+    media = get_media_from_message(message)
+    properties = FileProperties(
+        file_id=FileId.decode(media.file_id),
+        file_unique_id=media.file_unique_id,
+        file_size=media.file_size,
+        mime_type=getattr(media, "mime_type", None),
+        file_name=getattr(media, "file_name", None)
+    )
+    _properties_cache.set(cache_key, properties)
+    return properties
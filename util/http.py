@@ -0,0 +1,46 @@
+# util/http.py
+
+import asyncio
+import logging
+import aiohttp
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_loop = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the process-wide HTTP session, creating it on first use.
+
+    All outbound HTTP goes through this one session, so connections are kept
+    alive and reused per host, DNS answers are cached, and no single host can
+    take more than HTTP_MAX_CONNECTIONS_PER_HOST connections. Requests may pass
+    their own timeout; the default is HTTP_TIMEOUT in total.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    # A session is bound to the loop it was made on; benchmarks and scripts may run several loops.
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=Config.HTTP_MAX_CONNECTIONS,
+            limit_per_host=Config.HTTP_MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=Config.HTTP_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT),
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
@@ -0,0 +1,93 @@
+# util/ingest_queue.py
+
+import asyncio
+import logging
+from config import Config
+from database.db import (
+    enqueue_ingest_job, claim_ingest_job,
+    update_ingest_job, reset_interrupted_ingest_jobs
+)
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """
+    Feeds new Index DB files to Bot.process_new_file from a MongoDB-backed queue.
+
+    The channel handler only records a job, so a burst of thousands of files
+    costs one insert each instead of one task each. A fixed number of workers
+    claim jobs oldest first, never two of the same owner at once, which keeps
+    each owner's files in order. Jobs interrupted by a restart or crash are put
+    back in the queue on startup.
+    """
+
+    def __init__(self, bot, workers: int = None):
+        self.bot = bot
+        self.workers = max(1, workers or Config.INGEST_WORKERS)
+        self.messages = {}  # job_id -> Message received in this process, saves a refetch
+        self.busy_owners = set()
+        self.wakeup = asyncio.Event()
+        self.tasks = []
+
+    async def put(self, owner_id: int, message) -> bool:
+        """Queues a file (again, if its last attempt failed). Returns False if the same file is already queued or was recently processed."""
+        job_id = await enqueue_ingest_job(owner_id, message)
+        if not job_id:
+            return False
+        self.messages[job_id] = message
+        self.wakeup.set()
+        return True
+
+    async def start(self):
+        requeued = await reset_interrupted_ingest_jobs()
+        if requeued:
+            logger.info(f"Re-queued {requeued} ingest job(s) interrupted by the last shutdown.")
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Ingest queue started with {self.workers} worker(s).")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    async def _worker(self):
+        while True:
+            # Clear before looking, so a put() that lands after the lookup still wakes us.
+            self.wakeup.clear()
+            try:
+                job = await claim_ingest_job(self.busy_owners)
+            except Exception as e:
+                logger.error(f"Could not claim an ingest job: {e}")
+                await asyncio.sleep(5)
+                continue
+
+            if not job:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=30)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            owner_id = job['owner_id']
+            self.busy_owners.add(owner_id)
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.exception(f"Ingest job {job['_id']} failed: {e}")
+                await update_ingest_job(job['_id'], 'failed', error=str(e))
+            finally:
+                self.busy_owners.discard(owner_id)
+                # Jobs of this owner may have been skipped while it was busy.
+                self.wakeup.set()
+
+    async def _run(self, job):
+        message = self.messages.pop(job['_id'], None)
+        if message is None:
+            # Queued before a restart: fetch the file message again.
+            message = await self.bot.get_messages(job['source_chat_id'], job['source_message_id'])
+        if not message or message.empty or not message.media:
+            logger.warning(f"Source message of ingest job {job['_id']} no longer exists. Dropping it.")
+            await update_ingest_job(job['_id'], 'failed', error="source message not found")
+            return
+        await self.bot.process_new_file(message, job['owner_id'], job_id=job['_id'])
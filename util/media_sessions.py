@@ -0,0 +1,188 @@
+# util/media_sessions.py
+
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pyrogram import Client, raw
+from pyrogram.session import Session, Auth
+from pyrogram.errors import AuthBytesInvalid
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class MediaSessionManager:
+    """
+    Owns the media sessions a client uses for upload.GetFile.
+
+    Each DC gets a small pool of authorised sessions. Creation is single-flight per
+    DC, so a burst of streams to a cold DC runs Export/ImportAuthorization once.
+    Requests are spread over the least-busy session of the pool, and a keepalive
+    loop pings every session and swaps out dead ones. A replaced session is only
+    stopped once the requests already running on it have finished.
+    """
+
+    def __init__(self, client: Client, sessions_per_dc: int = None, keepalive_interval: int = None, on_new_dc=None):
+        self.client = client
+        self.sessions_per_dc = max(1, sessions_per_dc or Config.MEDIA_SESSIONS_PER_DC)
+        self.keepalive_interval = keepalive_interval or Config.MEDIA_SESSION_KEEPALIVE
+        self.on_new_dc = on_new_dc
+        self.pools = {}  # dc_id -> [Session]
+        self.in_use = defaultdict(int)  # Session -> requests currently running on it
+        self.retired = set()
+        self.locks = defaultdict(asyncio.Lock)
+        self._keepalive_task = None
+        self._fill_tasks = {}
+
+    async def _create_session(self, dc_id: int) -> Session:
+        client = self.client
+        if dc_id != await client.storage.dc_id():
+            session = Session(
+                client, dc_id, await Auth(client, dc_id, await client.storage.test_mode()).create(),
+                await client.storage.test_mode(), is_media=True
+            )
+            await session.start()
+
+            for i in range(3):
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
+                try:
+                    await session.invoke(
+                        raw.functions.auth.ImportAuthorization(
+                            id=exported_auth.id,
+                            bytes=exported_auth.bytes
+                        )
+                    )
+                    break
+                except AuthBytesInvalid:
+                    continue
+        else:
+            # The file lives in our home DC, so the existing auth key is already valid there.
+            session = Session(
+                client, dc_id, await client.storage.auth_key(),
+                await client.storage.test_mode(), is_media=True
+            )
+            await session.start()
+        logger.info(f"Created media session for DC {dc_id} ({client.name}).")
+        return session
+
+    async def _get_pool(self, dc_id: int):
+        pool = self.pools.get(dc_id)
+        if pool:
+            return pool
+        async with self.locks[dc_id]:
+            pool = self.pools.get(dc_id)
+            if pool:
+                return pool
+            # Only the first session is created inline; the rest are filled in the background.
+            self.pools[dc_id] = [await self._create_session(dc_id)]
+            if self.on_new_dc:
+                asyncio.create_task(self.on_new_dc(dc_id))
+        self._schedule_fill(dc_id)
+        return self.pools[dc_id]
+
+    def _schedule_fill(self, dc_id: int):
+        task = self._fill_tasks.get(dc_id)
+        if len(self.pools.get(dc_id, [])) < self.sessions_per_dc and (task is None or task.done()):
+            self._fill_tasks[dc_id] = asyncio.create_task(self._fill_pool(dc_id))
+
+    async def _fill_pool(self, dc_id: int):
+        async with self.locks[dc_id]:
+            pool = self.pools.setdefault(dc_id, [])
+            while len(pool) < self.sessions_per_dc:
+                try:
+                    pool.append(await self._create_session(dc_id))
+                except Exception as e:
+                    logger.warning(f"Could not add media session for DC {dc_id}: {e}")
+                    break
+
+    async def prewarm(self, dc_ids):
+        """Builds full pools for the given DCs ahead of the first stream."""
+        for dc_id in set(filter(None, dc_ids)):
+            try:
+                await self._get_pool(dc_id)
+                await self._fill_pool(dc_id)
+            except Exception as e:
+                logger.warning(f"Could not pre-warm media sessions for DC {dc_id}: {e}")
+
+    @asynccontextmanager
+    async def session(self, dc_id: int):
+        """Yields the least-busy session for a DC for the duration of one request."""
+        pool = await self._get_pool(dc_id)
+        session = min(pool, key=lambda s: self.in_use[s])
+        self.in_use[session] += 1
+        try:
+            yield session
+        finally:
+            self.in_use[session] -= 1
+            if session in self.retired and self.in_use[session] <= 0:
+                await self._stop_session(session)
+
+    async def _stop_session(self, session: Session):
+        self.retired.discard(session)
+        self.in_use.pop(session, None)
+        try:
+            await session.stop()
+        except Exception as e:
+            logger.warning(f"Error while stopping media session: {e}")
+
+    async def _is_alive(self, session: Session) -> bool:
+        try:
+            await session.invoke(raw.functions.Ping(ping_id=random.randint(1, 2**31)), retries=0, timeout=10)
+            return True
+        except Exception as e:
+            logger.warning(f"Media session health probe failed: {e}")
+            return False
+
+    async def check_health(self):
+        for dc_id, pool in list(self.pools.items()):
+            for session in list(pool):
+                if await self._is_alive(session):
+                    continue
+                async with self.locks[dc_id]:
+                    try:
+                        replacement = await self._create_session(dc_id)
+                    except Exception as e:
+                        logger.error(f"Could not replace dead media session for DC {dc_id}: {e}")
+                        continue
+                    pool[pool.index(session)] = replacement
+                logger.info(f"Replaced dead media session for DC {dc_id}.")
+                if self.in_use[session] > 0:
+                    self.retired.add(session)
+                else:
+                    await self._stop_session(session)
+
+    async def keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Media session keepalive failed: {e}", exc_info=True)
+
+    def start(self):
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self.keepalive_loop())
+
+    async def stop(self):
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        for pool in self.pools.values():
+            for session in pool:
+                await self._stop_session(session)
+        for session in list(self.retired):
+            await self._stop_session(session)
+        self.pools.clear()
+
+
+def get_session_manager(client: Client) -> MediaSessionManager:
+    """Returns the client's MediaSessionManager, attaching one on first use."""
+    manager = getattr(client, 'media_session_manager', None)
+    if manager is None:
+        manager = MediaSessionManager(client)
+        client.media_session_manager = manager
+    return manager
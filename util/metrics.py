@@ -0,0 +1,207 @@
+# util/metrics.py
+
+import asyncio
+import logging
+import threading
+import time
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Labels added to every sample, e.g. {"worker": "2"} inside a stream worker process.
+CONST_LABELS = {}
+
+_registry = []
+
+
+def _format_labels(labels: dict) -> str:
+    labels = {**CONST_LABELS, **labels}
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        # Mongo command events arrive on driver threads, so updates are locked.
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(dict(key))} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the duration of its block."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            labels = dict(key)
+            for bound, count in zip(self.buckets, state):
+                yield f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {count}"
+            yield f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {state[-1]}"
+            yield f"{self.name}_sum{_format_labels(labels)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(labels)} {state[-1]}"
+
+
+def render_metrics() -> str:
+    """Renders every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Streaming ---
+ACTIVE_STREAMS = Gauge("stream_active", "Streams and downloads currently being served.")
+BYTES_SERVED = Counter("stream_bytes_served_total", "Bytes sent to stream/download clients, by source (telegram or cache).")
+GETFILE_SECONDS = Histogram("telegram_getfile_seconds", "Latency of upload.GetFile requests per DC.")
+
+# --- Telegram API ---
+FLOOD_WAITS = Counter("telegram_floodwait_total", "FloodWait errors received, by where they were raised.")
+FLOOD_WAIT_SECONDS = Histogram(
+    "telegram_floodwait_seconds", "Requested FloodWait durations.",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+# --- Batches ---
+BATCH_FINALIZE_SECONDS = Histogram(
+    "batch_finalize_seconds", "Time to turn a collected batch into posts.",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+
+# --- External services (IMDb, poster sources, shorteners) ---
+EXTERNAL_SECONDS = Histogram("external_call_seconds", "Latency of calls to external services.")
+EXTERNAL_RESULTS = Counter("external_call_results_total", "Outcomes of external lookups (hit/miss for caches, found/empty/error for calls).")
+
+# --- MongoDB ---
+MONGO_SECONDS = Histogram("mongo_command_seconds", "Latency of MongoDB commands, by command name.")
+MONGO_FAILURES = Counter("mongo_command_failures_total", "Failed MongoDB commands, by command name.")
+MONGO_UNINDEXED = Counter("mongo_unindexed_slow_queries_total", "Slow MongoDB queries whose plan scans the whole collection, by command and collection.")
+
+# --- Event loop ---
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer that should have fired immediately.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Feeds MongoDB command latencies into mongo_command_seconds.
+
+    With `on_slow`, query commands that take longer than `slow_ms` are passed to
+    it as (command_name, command, seconds) so their plans can be checked. It is
+    called on a driver thread and must not block.
+    """
+
+    QUERY_COMMANDS = frozenset({"find", "count", "distinct", "aggregate", "update", "delete", "findAndModify"})
+
+    def __init__(self, slow_ms: float = 0, on_slow=None):
+        self.slow_seconds = slow_ms / 1000
+        self.on_slow = on_slow
+        self._commands = {}
+
+    def started(self, event):
+        if self.on_slow and event.command_name in self.QUERY_COMMANDS:
+            self._commands[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_SECONDS.observe(seconds, command=event.command_name)
+        command = self._commands.pop((event.connection_id, event.request_id), None)
+        if command is not None and seconds >= self.slow_seconds:
+            self.on_slow(event.command_name, command, seconds)
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+        MONGO_FAILURES.inc(command=event.command_name)
+        self._commands.pop((event.connection_id, event.request_id), None)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Measures how much later than scheduled a short sleep wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - interval))
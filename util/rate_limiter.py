@@ -0,0 +1,150 @@
+# util/rate_limiter.py
+
+import asyncio
+import logging
+import time
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Telegram's documented bot limits: about 30 messages per second overall, about
+# one message per second in a single private chat and 20 messages per minute in
+# a group or channel. (rate per second, burst)
+GLOBAL_LIMIT = (30, 30)
+PRIVATE_CHAT_LIMIT = (1, 3)
+GROUP_CHAT_LIMIT = (20 / 60, 5)
+# The bot's own storage channel has no audience to flood, and every ingested file
+# is copied into it: 30 per minute, with bursts of 10 for forwarded batches.
+STORAGE_CHAT_LIMIT = (0.5, 10)
+METHOD_CLASS_LIMITS = {
+    "send": (30, 30),
+    "edit": (20, 20),
+    "delete": (30, 30),
+    "other": (30, 30),
+}
+
+# Learned slow-downs never go below this fraction of the documented rate.
+MIN_RATE_FACTOR = 0.1
+
+
+class TokenBucket:
+    """
+    A token bucket that also learns from FloodWait: every FloodWait blocks the
+    bucket for the requested time and halves its rate, and each successful call
+    afterwards wins back a little of the original rate.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.default_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # The lock keeps waiters in FIFO order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.rate = max(self.default_rate * MIN_RATE_FACTOR, self.rate / 2)
+        # One call may go as soon as the wait is over; the rest follow at the reduced rate.
+        self.tokens = 1
+        self.updated = self.blocked_until
+
+    def reward(self):
+        if self.rate < self.default_rate:
+            self.rate = min(self.default_rate, self.rate + self.default_rate * 0.05)
+
+    @property
+    def blocked_for(self) -> float:
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+def method_class(name: str) -> str:
+    """Maps a Pyrogram method name onto the class it is rate limited as."""
+    if name.startswith(("send_", "copy_", "forward_")) or name in ("copy", "forward", "reply", "reply_text", "reply_photo"):
+        return "send"
+    if name.startswith("edit_"):
+        return "edit"
+    if name.startswith("delete"):
+        return "delete"
+    return "other"
+
+
+class RateLimiter:
+    """
+    Global, per-method-class and per-chat token buckets. A call waits for all
+    the buckets it belongs to, and a FloodWait only throttles the bucket it
+    came from: the chat if it is known, otherwise the method class. Other
+    chats keep flowing meanwhile.
+    """
+
+    def __init__(self, storage_chat_ids=()):
+        self.storage_chat_ids = {chat_id for chat_id in storage_chat_ids if chat_id}
+        self.global_bucket = TokenBucket(*GLOBAL_LIMIT)
+        self.method_buckets = {name: TokenBucket(*limit) for name, limit in METHOD_CLASS_LIMITS.items()}
+        # Idle chat buckets simply expire.
+        self.chat_buckets = TTLCache(maxsize=20000, ttl=3600)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id in self.storage_chat_ids:
+                limit = STORAGE_CHAT_LIMIT
+            else:
+                limit = PRIVATE_CHAT_LIMIT if chat_id > 0 else GROUP_CHAT_LIMIT
+            bucket = TokenBucket(*limit)
+        # Re-setting refreshes the expiry of chats in active use.
+        self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    def _buckets(self, chat_id, method: str):
+        buckets = []
+        if isinstance(chat_id, int) and method != "other":
+            buckets.append(self._chat_bucket(chat_id))
+        buckets.append(self.method_buckets[method])
+        buckets.append(self.global_bucket)
+        return buckets
+
+    async def acquire(self, chat_id, method: str = "send"):
+        for bucket in self._buckets(chat_id, method):
+            await bucket.acquire()
+
+    def report_success(self, chat_id, method: str = "send"):
+        for bucket in self._buckets(chat_id, method):
+            bucket.reward()
+
+    def report_flood_wait(self, chat_id, method: str, seconds: float):
+        if isinstance(chat_id, int) and method != "other":
+            self._chat_bucket(chat_id).penalize(seconds)
+            logger.warning(f"FloodWait of {seconds}s in chat {chat_id} ({method}); throttling that chat only.")
+        else:
+            self.method_buckets[method].penalize(seconds)
+            logger.warning(f"FloodWait of {seconds}s on '{method}' calls; throttling that method class.")
+
+    def status(self):
+        """Returns (bucket name, current rate per second, seconds blocked) for throttled buckets."""
+        rows = [("global", self.global_bucket)] + [(f"method:{name}", b) for name, b in self.method_buckets.items()]
+        rows += [(f"chat:{chat_id}", bucket) for chat_id, bucket in self.chat_buckets.items()]
+        return [
+            (name, bucket.rate, bucket.blocked_for) for name, bucket in rows
+            if bucket.blocked_for > 0 or bucket.rate < bucket.default_rate
+        ]
@@ -1,28 +1,61 @@
+import hashlib
 import jinja2
-import aiofiles
 import logging
 from pyrogram import Client
 from util.custom_dl import ByteStreamer
+from utils.cache import TTLCache
+
+# Templates are compiled once and kept in memory. auto_reload only re-reads a
+# template when its mtime changes, and the bytecode cache skips recompiling
+# unchanged templates after a restart.
+_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader('template'),
+    auto_reload=True,
+    bytecode_cache=jinja2.FileSystemBytecodeCache(),
+)
+
+# (app_url, message_id) -> (template, html, etag)
+_rendered_pages = TTLCache(maxsize=5000, ttl=3600)
+
+
+def load_templates():
+    """Compiles all templates up front so the first request doesn't pay for it."""
+    for name in ('player.html', 'watch_page.html'):
+        try:
+            _env.get_template(name)
+        except jinja2.TemplateNotFound:
+            logging.error(f"FATAL: {name} template not found in /template directory!")
+
+
+def get_player_page(bot: Client, message_id: int):
+    """
+    Returns (html, etag) for the watch page of a message. The page only depends
+    on the message id, so it is rendered once and re-rendered only when
+    player.html has changed on disk.
+    """
+    template = _env.get_template('player.html')
+    key = (bot.app_url, message_id)
+    cached = _rendered_pages.get(key)
+    if cached and cached[0] is template:
+        return cached[1], cached[2]
+
+    # --- DECREED MODIFICATION: Use bot.app_url ---
+    # bot.app_url is set in bot.py's __init__ and is already stripped of trailing slashes
+    html = template.render(file_url=f"{bot.app_url}/stream/{message_id}")
+    etag = f'"{hashlib.sha1(html.encode()).hexdigest()[:20]}"'
+    _rendered_pages.set(key, (template, html, etag))
+    return html, etag
+
 
 # --- LEGENDARY MODIFICATION: Create a dedicated renderer for the new player page ---
 async def render_player_page(bot: Client, message_id: int):
     """
     Renders the new player.html template for the watch page.
     """
-    
-    # --- DECREED MODIFICATION: Use bot.app_url ---
-    # bot.app_url is set in bot.py's __init__ and is already stripped of trailing slashes
-    file_url = f"{bot.app_url}/stream/{message_id}"
-    
     try:
-        async with aiofiles.open('template/player.html', 'r') as f:
-            template_content = await f.read()
-        template = jinja2.Template(template_content)
-
-        return template.render(
-            file_url=file_url
-        )
-    except FileNotFoundError:
+        html, _ = get_player_page(bot, message_id)
+        return html
+    except jinja2.TemplateNotFound:
         logging.error("FATAL: player.html template not found in /template directory!")
         return "<html><body><h1>500 Internal Server Error</h1><p>Template file not found.</p></body></html>"
     except Exception as e:
@@ -51,9 +84,7 @@ async def render_page(bot: Client, message_id: int):
     download_url = f"{bot.app_url}/download/{message_id}"
     
     try:
-        async with aiofiles.open('template/watch_page.html', 'r') as f:
-            template_content = await f.read()
-        template = jinja2.Template(template_content)
+        template = _env.get_template('watch_page.html')
 
         return template.render(
             heading=f"Watch {file_name}",
@@ -61,9 +92,12 @@ async def render_page(bot: Client, message_id: int):
             stream_url=stream_url,
             download_url=download_url
         )
-    except FileNotFoundError:
+    except jinja2.TemplateNotFound:
         logging.error("FATAL: watch_page.html template not found in /template directory!")
         return "<html><body><h1>500 Internal Server Error</h1><p>Template file not found.</p></body></html>"
     except Exception as e:
         logging.error(f"Error rendering template: {e}", exc_info=True)
         return "<html><body><h1>500 Internal Server Error</h1><p>Could not render template.</p></body></html>"
+
+
+load_templates()
@@ -0,0 +1,54 @@
+# utils/cache.py
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A small in-process LRU cache whose entries also expire after `ttl` seconds.
+    Not thread-safe; meant to be used from the event loop only.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def items(self):
+        """Live (key, value) pairs, without touching the LRU order."""
+        now = time.monotonic()
+        return [(key, value) for key, (expires_at, value) in list(self._data.items()) if expires_at >= now]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+_MISSING = object()
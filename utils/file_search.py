@@ -0,0 +1,101 @@
+# utils/file_search.py
+
+import bisect
+import re
+from array import array
+from collections import Counter, defaultdict
+from utils.cache import TTLCache
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def search_tokens(text: str) -> list:
+    """Normalized words of a file name or query: case-folded, split on anything that isn't a letter or digit."""
+    return TOKEN_RE.findall(text.casefold()) if text else []
+
+
+class FileSearchIndex:
+    """
+    In-memory inverted index of one owner's files.
+
+    Files are numbered in the order they are added (oldest first) and every token
+    maps to the ascending list of file numbers containing it. A query matches the
+    files that contain, for each query word, a token starting with that word;
+    results are ranked by how many query words match whole tokens, then by
+    whether the query appears as a phrase, then newest first.
+    """
+
+    def __init__(self):
+        self.files = []  # number -> (_id, file_unique_id, file_name)
+        self.keys = []  # number -> space-joined tokens, for phrase matches
+        self.postings = defaultdict(lambda: array('I'))
+        self._vocabulary = None  # sorted tokens, rebuilt lazily after additions
+        self.results = TTLCache(maxsize=32, ttl=300)
+
+    def __len__(self):
+        return len(self.files)
+
+    def add(self, file_id, file_unique_id: str, file_name: str, tokens: list):
+        number = len(self.files)
+        self.files.append((file_id, file_unique_id, file_name))
+        self.keys.append(" ".join(tokens))
+        for token in set(tokens):
+            self.postings[token].append(number)
+        self._vocabulary = None
+        self.results.clear()
+
+    def file(self, number: int) -> dict:
+        file_id, file_unique_id, file_name = self.files[number]
+        return {'_id': file_id, 'file_unique_id': file_unique_id, 'file_name': file_name}
+
+    def _expand(self, word: str):
+        """Every indexed token that starts with `word`."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self._vocabulary, word)
+        end = bisect.bisect_left(self._vocabulary, word + "\U0010ffff", start)
+        return self._vocabulary[start:end]
+
+    def _rank(self, words: tuple) -> list:
+        match_sets = []
+        for word in words:
+            matches = set()
+            for token in self._expand(word):
+                matches.update(self.postings[token])
+            if not matches:
+                return []
+            match_sets.append(matches)
+        # Intersecting from the smallest set keeps every step small.
+        match_sets.sort(key=len)
+        candidates = match_sets[0].intersection(*match_sets[1:])
+        if not candidates:
+            return []
+
+        scores = Counter()
+        for word in words:
+            exact = self.postings.get(word)
+            if exact:
+                scores.update(candidates.intersection(exact))
+        if len(words) > 1:
+            phrase = " ".join(words)
+            scores.update({number: len(words) for number in candidates if phrase in self.keys[number]})
+
+        by_score = defaultdict(list)
+        for number, score in scores.items():
+            by_score[score].append(number)
+        by_score[0] = list(candidates.difference(scores))
+        ranked = []
+        for score in sorted(by_score, reverse=True):
+            ranked.extend(sorted(by_score[score], reverse=True))
+        return ranked
+
+    def search(self, query: str) -> list:
+        """Ranked file numbers for `query`; repeated queries (page turns) are served from a cache."""
+        words = tuple(dict.fromkeys(search_tokens(query)))
+        if not words:
+            return []
+        ranked = self.results.get(words)
+        if ranked is None:
+            ranked = self._rank(words)
+            self.results.set(words, ranked)
+        return ranked
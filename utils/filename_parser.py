@@ -0,0 +1,178 @@
+# utils/filename_parser.py
+
+import re
+import PTN
+from functools import lru_cache
+
+# --- DECREED ADDITION: START ---
+# A comprehensive map for detecting languages from filenames.
+# This map handles various abbreviations and full names, mapping them to a standard format.
+LANGUAGE_MAP = {
+    'hin': 'Hindi', 'hindi': 'Hindi',
+    'eng': 'English', 'english': 'English',
+    'tam': 'Tamil', 'tamil': 'Tamil',
+    'tel': 'Telugu', 'telugu': 'Telugu',
+    'mal': 'Malayalam', 'malayalam': 'Malayalam',
+    'kan': 'Kannada', 'kannada': 'Kannada',
+    'pun': 'Punjabi', 'punjabi': 'Punjabi',
+    'jap': 'Japanese', 'japanese': 'Japanese',
+    'kor': 'Korean', 'korean': 'Korean',
+    'chi': 'Chinese', 'chinese': 'Chinese',
+    'fre': 'French', 'french': 'French',
+    'ger': 'German', 'german': 'German',
+    'spa': 'Spanish', 'spanish': 'Spanish',
+    'ita': 'Italian', 'italian': 'Italian',
+    'rus': 'Russian', 'russian': 'Russian',
+    'ara': 'Arabic', 'arabic': 'Arabic',
+    'tur': 'Turkish', 'turkish': 'Turkish',
+    'ind': 'Indonesian', 'indonesian': 'Indonesian',
+    'multi': 'Multi-Audio', 'dual': 'Dual-Audio'
+}
+# --- DECREED ADDITION: END ---
+
+
+# Every pattern is compiled once at import; the parser runs for each file of every batch.
+SITE_RE = re.compile(r'(?:www\.)?[\w-]+\.(?:com|org|net|xyz|me|io|in|cc|biz|world|info|club|mobi|press|top|site|tech|online|store|live|co|shop|fun|tamilmv)\b', re.IGNORECASE)
+CHANNEL_TAG_RE = re.compile(r'@[a-zA-Z0-9_]+')
+BRACKETS_RE = re.compile(r'\[.*?\]')
+SEASON_EPISODE_TAG_RE = re.compile(r'\bS\d{1,2}\b|\bE\d{1,4}\b', re.IGNORECASE)
+SEPARATORS_RE = re.compile(r'[-_.]')
+LEADING_SYMBOLS_RE = re.compile(r'^[^\w\s]+')
+WHITESPACE_RE = re.compile(r'\s+')
+WORD_RE = re.compile(r'\w+')
+
+# Tried in order; the first one with a valid (ascending) range wins.
+RANGE_PATTERNS = [
+    (r'(\d{1,2})\s+(?:To|-|–|—)\s+(\d{1,2})', 'no_season'),
+    (r'(\d{1,2})\s+(\d{1,2})(?=\s\d{4})', 'no_season'),
+    (r'S(\d{1,2}).*?EP\((\d{1,4})-(\d{1,4})\)', 'season'),
+    (r'S(\d{1,2}).*?\[E?(\d{1,4})\s*-\s*E?(\d{1,4})\]', 'season'),
+    (r'S(\d{1,2}).*?\[(\d{1,4})\s*To\s*(\d{1,4})\s*Eps?\]', 'season'),
+    (r'S(\d{1,2}).*?\[EP\s*(\d{1,4})\s*to\s*(\d{1,4})\]', 'season'),
+    (r'S(\d{1,2}).*?\[Epi\s*(\d{1,4})\s*-\s*(\d{1,4})\]', 'season'),
+    (r'S(\d{1,2}).*?Ep\.?(\d{1,4})-(\d{1,4})', 'season'),
+    (r'S(\d{1,2})\s*E(\d{1,4})[-\s]*E(\d{1,4})', 'season'),
+    (r'\.Ep\.\[(\d{1,4})-(\d{1,4})\]', 'no_season'),
+    (r'Ep\s*(\d{1,4})\s*-\s*(\d{1,4})', 'no_season'),
+    (r'(?:E|Episode)s?\.?\s?(\d{1,4})\s?(?:to|-|–|—)\s?(\d{1,4})', 'no_season'),
+]
+RANGE_RES = [(re.compile(pattern, re.IGNORECASE), p_type) for pattern, p_type in RANGE_PATTERNS]
+# Something every range pattern needs: a number followed by a dash or 'to', an
+# 'E<n> E<n>' pair, or the '<n> <n> <year>' shape. Most names hold no range, and
+# this single cheap scan rules out all of the patterns above for them.
+RANGE_HINT_RE = re.compile(r'\d\s*(?:-|–|—|to)|E\d+[-\s]*E\d|\d\s+\d{1,2}\s\d{4}', re.IGNORECASE)
+
+JUNK_WORDS = [
+    'Ep', 'Eps', 'Episode', 'Episodes', 'Season', 'Series', 'South', 'Dubbed', 'Completed',
+    'Web', r'\d+Kbps', 'UNCUT', 'ORG', 'HQ', 'ESubs', 'MSubs', 'REMASTERED', 'REPACK',
+    'PROPER', 'iNTERNAL', 'Sample', 'Video', 'Dual', 'Audio', 'Multi', 'Hollywood',
+    'New', 'Combined', 'Complete', 'Chapter', 'PSA', 'JC', 'DIDAR', 'StarBoy',
+    'Hindi', 'English', 'Tamil', 'Telugu', 'Kannada', 'Malayalam', 'Punjabi', 'Japanese', 'Korean',
+    'NF', 'AMZN', 'MAX', 'DSNP', 'ZEE5', 'WEB-DL', 'HDRip', 'WEBRip', 'HEVC', 'x265', 'x264', 'AAC',
+    '1tamilmv', 'www'
+]
+JUNK_RE = re.compile(r'\b(' + r'|'.join(JUNK_WORDS) + r')\b', re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _year_re(year: str):
+    return re.compile(r'\b' + year + r'\b')
+
+
+def detect_languages(text: str) -> set:
+    """
+    Languages named in `text` (lower-cased). A key only counts as a whole word,
+    so looking up every word in LANGUAGE_MAP finds the same languages as one
+    word-boundary search per key.
+    """
+    return {LANGUAGE_MAP[word] for word in WORD_RE.findall(text) if word in LANGUAGE_MAP}
+
+
+def parse_filename_offline(name: str) -> dict:
+    """
+    The CPU-bound part of clean_and_parse_filename: regex passes, PTN and
+    language detection, without the IMDb lookup. Runs in the parser process
+    pool, so it must only depend on this module.
+    """
+    original_name = name
+
+    name_for_parsing = name.replace('_', ' ').replace('.', ' ')
+    # SITE_RE needs a dot and every dot was just replaced, so skip a scan that can't match.
+    if '.' in name_for_parsing:
+        name_for_parsing = SITE_RE.sub('', name_for_parsing)
+    name_for_parsing = CHANNEL_TAG_RE.sub('', name_for_parsing).strip()
+
+
+    season_info_str = ""
+    episode_info_str = ""
+    raw_episode_text_to_remove = ""
+
+    if RANGE_HINT_RE.search(name_for_parsing):
+        for pattern_re, p_type in RANGE_RES:
+            match = pattern_re.search(name_for_parsing)
+            if match:
+                groups = match.groups()
+                raw_episode_text_to_remove = match.group(0)
+                if p_type == 'season':
+                    if not season_info_str: season_info_str = f"S{int(groups[0]):02d}"
+                    start_ep, end_ep = groups[1], groups[2]
+                else:
+                    start_ep, end_ep = groups[0], groups[1]
+
+                if int(start_ep) < int(end_ep):
+                    episode_info_str = f"E{int(start_ep):02d}-E{int(end_ep):02d}"
+                    name_for_parsing = name_for_parsing.replace(raw_episode_text_to_remove, ' ', 1)
+                    break 
+
+    name_for_ptn = BRACKETS_RE.sub('', name_for_parsing).strip()
+    parsed_info = PTN.parse(name_for_ptn)
+    
+    initial_title = parsed_info.get('title', '').strip()
+    if not season_info_str and parsed_info.get('season'):
+        season_info_str = f"S{parsed_info.get('season'):02d}"
+    if not episode_info_str and parsed_info.get('episode'):
+        episode = parsed_info.get('episode')
+        if isinstance(episode, list):
+            if len(episode) > 1: episode_info_str = f"E{min(episode):02d}-E{max(episode):02d}"
+            elif episode: episode_info_str = f"E{episode[0]:02d}"
+        else: episode_info_str = f"E{episode:02d}"
+    
+    year_from_filename = parsed_info.get('year')
+    
+    # --- DECREED MODIFICATION: START ---
+    # Hybrid language detection using PTN's output and our custom map.
+    search_string_lower = name.lower()
+    
+    # Also check PTN's audio tag for languages
+    ptn_audio_tags = parsed_info.get('audio', '')
+    if isinstance(ptn_audio_tags, list):
+        ptn_audio_tags = " ".join(ptn_audio_tags)
+    
+    search_string_lower += " " + ptn_audio_tags.lower()
+    found_languages = detect_languages(search_string_lower)
+    # --- DECREED MODIFICATION: END ---
+
+    title_to_clean = initial_title
+    if year_from_filename:
+        title_to_clean = _year_re(str(year_from_filename)).sub('', title_to_clean)
+    
+    if raw_episode_text_to_remove:
+        title_to_clean = title_to_clean.replace(raw_episode_text_to_remove, '')
+        
+    title_to_clean = SEASON_EPISODE_TAG_RE.sub('', title_to_clean)
+    
+    cleaned_title = JUNK_RE.sub('', title_to_clean)
+    cleaned_title = SEPARATORS_RE.sub(' ', cleaned_title)
+    cleaned_title = LEADING_SYMBOLS_RE.sub('', cleaned_title)
+    cleaned_title = WHITESPACE_RE.sub(' ', cleaned_title).strip()
+    
+    if not cleaned_title: cleaned_title = " ".join(original_name.split('.')[:-1])
+
+    return {
+        "cleaned_title": cleaned_title,
+        "year": year_from_filename,
+        "season_info": season_info_str,
+        "episode_info": episode_info_str,
+        "languages": sorted(list(found_languages)),
+        "quality_tags": " | ".join(filter(None, [parsed_info.get('resolution'), parsed_info.get('quality'), parsed_info.get('codec')]))
+    }
@@ -1,18 +1,25 @@
 # widhvans/store/widhvans-store-a32dae6d5f5487c7bc78b13e2cdc18082aef6c58/utils/helpers.py
 
 import re
+import os
+import datetime
 import base64
 import logging
-import PTN
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from imdb import Cinemagoer
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import UserNotParticipant, ChatAdminRequired, ChannelInvalid, PeerIdInvalid, ChannelPrivate
 from config import Config
-from database.db import get_user, remove_from_list, update_user
+from database.db import get_user, remove_from_list, update_user, get_cached_imdb_title, save_cached_imdb_title
 from features.poster import get_poster
-from features.shortener import get_shortlink
+from features.shortener import shorten_links
 from thefuzz import fuzz
+from util.metrics import EXTERNAL_SECONDS, EXTERNAL_RESULTS
+from utils.cache import TTLCache
+from utils.filename_parser import LANGUAGE_MAP, parse_filename_offline
 
 logger = logging.getLogger(__name__)
 
@@ -21,32 +28,6 @@ TEXT_MESSAGE_LIMIT = 4096
 
 ia = Cinemagoer()
 
-# --- DECREED ADDITION: START ---
-# A comprehensive map for detecting languages from filenames.
-# This map handles various abbreviations and full names, mapping them to a standard format.
-LANGUAGE_MAP = {
-    'hin': 'Hindi', 'hindi': 'Hindi',
-    'eng': 'English', 'english': 'English',
-    'tam': 'Tamil', 'tamil': 'Tamil',
-    'tel': 'Telugu', 'telugu': 'Telugu',
-    'mal': 'Malayalam', 'malayalam': 'Malayalam',
-    'kan': 'Kannada', 'kannada': 'Kannada',
-    'pun': 'Punjabi', 'punjabi': 'Punjabi',
-    'jap': 'Japanese', 'japanese': 'Japanese',
-    'kor': 'Korean', 'korean': 'Korean',
-    'chi': 'Chinese', 'chinese': 'Chinese',
-    'fre': 'French', 'french': 'French',
-    'ger': 'German', 'german': 'German',
-    'spa': 'Spanish', 'spanish': 'Spanish',
-    'ita': 'Italian', 'italian': 'Italian',
-    'rus': 'Russian', 'russian': 'Russian',
-    'ara': 'Arabic', 'arabic': 'Arabic',
-    'tur': 'Turkish', 'turkish': 'Turkish',
-    'ind': 'Indonesian', 'indonesian': 'Indonesian',
-    'multi': 'Multi-Audio', 'dual': 'Dual-Audio'
-}
-# --- DECREED ADDITION: END ---
-
 def simple_clean_filename(name: str) -> str:
     """
     A simple, synchronous function to clean a filename for display purposes.
@@ -76,158 +57,187 @@ def format_bytes(size):
     elif n == 2: return f"{round(size)} {power_labels[n]}"
     else: return f"{int(size)} {power_labels[n]}"
 
+# Found titles rarely change; misses are retried sooner in case IMDb gains the title.
+IMDB_FOUND_TTL = datetime.timedelta(days=30)
+IMDB_MISS_TTL = datetime.timedelta(days=1)
+_imdb_memory_cache = TTLCache(maxsize=5000, ttl=6 * 3600)
+_imdb_inflight = {}  # normalized title -> Task of the lookup in progress
+
 async def get_definitive_title_from_imdb(title_from_filename):
     """
-    Uses the cinemagoer library to find the official title and year from IMDb,
-    with an ultra-strict "reality check" to prevent mismatches.
+    Resolves a cleaned title to its official IMDb title and year.
+
+    Resolutions are cached in memory and in MongoDB under the normalized title,
+    rejected and empty lookups included, so a series that is posted again costs
+    no IMDb calls. Concurrent lookups of the same title share a single query.
     """
     if not title_from_filename:
         return None, None
+    key = " ".join(title_from_filename.lower().split())
+
+    cached = _imdb_memory_cache.get(key)
+    if cached is not None:
+        EXTERNAL_RESULTS.inc(service="imdb_cache", result="hit_memory")
+        return cached
+
+    task = _imdb_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_resolve_imdb_title(key, title_from_filename))
+        _imdb_inflight[key] = task
+        task.add_done_callback(lambda _: _imdb_inflight.pop(key, None))
+    else:
+        EXTERNAL_RESULTS.inc(service="imdb_cache", result="joined")
+    # Shielded, so a cancelled caller doesn't cancel the lookup for the others.
+    return await asyncio.shield(task)
+
+async def _resolve_imdb_title(key: str, title_from_filename: str):
+    try:
+        stored = await get_cached_imdb_title(key)
+    except Exception as e:
+        logger.error(f"Could not read the IMDb cache for '{key}': {e}")
+        stored = None
+    if stored:
+        EXTERNAL_RESULTS.inc(service="imdb_cache", result="hit_mongo")
+        result = (stored.get('title'), stored.get('year'))
+        _imdb_memory_cache.set(key, result)
+        return result
+
+    EXTERNAL_RESULTS.inc(service="imdb_cache", result="miss")
     try:
-        loop = asyncio.get_event_loop()
-        logger.info(f"Querying IMDb with cleaned title: '{title_from_filename}'")
-        # Search for the movie
+        result = await _query_imdb(title_from_filename)
+    except Exception as e:
+        # Errors are not cached, the next batch tries again.
+        logger.error(f"Error fetching data from IMDb for '{title_from_filename}': {e}")
+        EXTERNAL_RESULTS.inc(service="imdb", result="error")
+        return None, None
+
+    ttl = IMDB_FOUND_TTL if result[0] else IMDB_MISS_TTL
+    _imdb_memory_cache.set(key, result, ttl=min(_imdb_memory_cache.ttl, ttl.total_seconds()))
+    try:
+        await save_cached_imdb_title(key, result[0], result[1], ttl)
+    except Exception as e:
+        logger.error(f"Could not store the IMDb resolution of '{key}': {e}")
+    return result
+
+async def _query_imdb(title_from_filename):
+    """
+    Uses the cinemagoer library to find the official title and year from IMDb,
+    with an ultra-strict "reality check" to prevent mismatches.
+    """
+    loop = asyncio.get_event_loop()
+    logger.info(f"Querying IMDb with cleaned title: '{title_from_filename}'")
+    # Search for the movie
+    with EXTERNAL_SECONDS.time(service="imdb_search"):
         results = await loop.run_in_executor(None, lambda: ia.search_movie(title_from_filename, results=1))
+    
+    if not results:
+        logger.warning(f"IMDb returned no results for '{title_from_filename}'")
+        EXTERNAL_RESULTS.inc(service="imdb", result="empty")
+        return None, None
         
-        if not results:
-            logger.warning(f"IMDb returned no results for '{title_from_filename}'")
-            return None, None
-            
-        movie = results[0]
-        imdb_title_raw = movie.get('title')
-        
-        normalized_original = title_from_filename.lower().strip()
-        normalized_imdb = imdb_title_raw.lower().strip()
-        
-        similarity = fuzz.ratio(normalized_original, normalized_imdb)
+    movie = results[0]
+    imdb_title_raw = movie.get('title')
+    
+    normalized_original = title_from_filename.lower().strip()
+    normalized_imdb = imdb_title_raw.lower().strip()
+    
+    similarity = fuzz.ratio(normalized_original, normalized_imdb)
 
-        logger.info(f"IMDb Check: Original='{normalized_original}', IMDb='{normalized_imdb}', Strict Ratio Similarity={similarity}%")
+    logger.info(f"IMDb Check: Original='{normalized_original}', IMDb='{normalized_imdb}', Strict Ratio Similarity={similarity}%")
 
-        if similarity < 60:
-            logger.warning(f"IMDb mismatch REJECTED! Original: '{title_from_filename}', IMDb: '{imdb_title_raw}', Similarity too low.")
-            return None, None
+    if similarity < 60:
+        logger.warning(f"IMDb mismatch REJECTED! Original: '{title_from_filename}', IMDb: '{imdb_title_raw}', Similarity too low.")
+        EXTERNAL_RESULTS.inc(service="imdb", result="rejected")
+        return None, None
 
+    with EXTERNAL_SECONDS.time(service="imdb_update"):
         await loop.run_in_executor(None, lambda: ia.update(movie, info=['main']))
-        
-        imdb_title = movie.get('title')
-        imdb_year = movie.get('year')
+    
+    imdb_title = movie.get('title')
+    imdb_year = movie.get('year')
 
-        if title_from_filename.lower() not in imdb_title.lower():
-             logger.warning(f"IMDb title corruption REJECTED! Original: '{title_from_filename}', Corrupted: '{imdb_title}'")
-             return None, None
+    if title_from_filename.lower() not in imdb_title.lower():
+         logger.warning(f"IMDb title corruption REJECTED! Original: '{title_from_filename}', Corrupted: '{imdb_title}'")
+         EXTERNAL_RESULTS.inc(service="imdb", result="rejected")
+         return None, None
 
-        logger.info(f"IMDb match ACCEPTED for '{title_from_filename}': '{imdb_title} ({imdb_year})'")
-        return imdb_title, imdb_year
+    logger.info(f"IMDb match ACCEPTED for '{title_from_filename}': '{imdb_title} ({imdb_year})'")
+    EXTERNAL_RESULTS.inc(service="imdb", result="found")
+    return imdb_title, imdb_year
 
-    except Exception as e:
-        logger.error(f"Error fetching data from IMDb for '{title_from_filename}': {e}")
-        return None, None
-
-async def clean_and_parse_filename(name: str, cache: dict = None):
+async def clean_and_parse_filename(name: str):
     """
     A next-gen, multi-pass robust filename parser that preserves all metadata.
+    The regex/PTN stage runs in the parser process pool; only the IMDb lookup
+    happens on the event loop.
     """
-    original_name = name
-
-    name_for_parsing = name.replace('_', ' ').replace('.', ' ')
-    name_for_parsing = re.sub(r'(?:www\.)?[\w-]+\.(?:com|org|net|xyz|me|io|in|cc|biz|world|info|club|mobi|press|top|site|tech|online|store|live|co|shop|fun|tamilmv)\b', '', name_for_parsing, flags=re.IGNORECASE)
-    name_for_parsing = re.sub(r'@[a-zA-Z0-9_]+', '', name_for_parsing).strip()
-
-
-    season_info_str = ""
-    episode_info_str = ""
-    raw_episode_text_to_remove = ""
-
-    search_name_for_eps = name.replace('_', '.').replace(' ', '.')
-    
-    range_patterns = [
-        (r'(\d{1,2})\s+(?:To|-|–|—)\s+(\d{1,2})', 'no_season'),
-        (r'(\d{1,2})\s+(\d{1,2})(?=\s\d{4})', 'no_season'),
-        (r'S(\d{1,2}).*?EP\((\d{1,4})-(\d{1,4})\)', 'season'),
-        (r'S(\d{1,2}).*?\[E?(\d{1,4})\s*-\s*E?(\d{1,4})\]', 'season'),
-        (r'S(\d{1,2}).*?\[(\d{1,4})\s*To\s*(\d{1,4})\s*Eps?\]', 'season'),
-        (r'S(\d{1,2}).*?\[EP\s*(\d{1,4})\s*to\s*(\d{1,4})\]', 'season'),
-        (r'S(\d{1,2}).*?\[Epi\s*(\d{1,4})\s*-\s*(\d{1,4})\]', 'season'),
-        (r'S(\d{1,2}).*?Ep\.?(\d{1,4})-(\d{1,4})', 'season'),
-        (r'S(\d{1,2})\s*E(\d{1,4})[-\s]*E(\d{1,4})', 'season'),
-        (r'\.Ep\.\[(\d{1,4})-(\d{1,4})\]', 'no_season'),
-        (r'Ep\s*(\d{1,4})\s*-\s*(\d{1,4})', 'no_season'),
-        (r'(?:E|Episode)s?\.?\s?(\d{1,4})\s?(?:to|-|–|—)\s?(\d{1,4})', 'no_season'),
-    ]
-
-    for pattern, p_type in range_patterns:
-        match = re.search(pattern, name_for_parsing, re.IGNORECASE)
-        if match:
-            groups = match.groups()
-            raw_episode_text_to_remove = match.group(0)
-            if p_type == 'season':
-                if not season_info_str: season_info_str = f"S{int(groups[0]):02d}"
-                start_ep, end_ep = groups[1], groups[2]
-            else:
-                start_ep, end_ep = groups[0], groups[1]
-
-            if int(start_ep) < int(end_ep):
-                episode_info_str = f"E{int(start_ep):02d}-E{int(end_ep):02d}"
-                name_for_parsing = name_for_parsing.replace(raw_episode_text_to_remove, ' ', 1)
-                break 
-
-    name_for_ptn = re.sub(r'\[.*?\]', '', name_for_parsing).strip()
-    parsed_info = PTN.parse(name_for_ptn)
-    
-    initial_title = parsed_info.get('title', '').strip()
-    if not season_info_str and parsed_info.get('season'):
-        season_info_str = f"S{parsed_info.get('season'):02d}"
-    if not episode_info_str and parsed_info.get('episode'):
-        episode = parsed_info.get('episode')
-        if isinstance(episode, list):
-            if len(episode) > 1: episode_info_str = f"E{min(episode):02d}-E{max(episode):02d}"
-            elif episode: episode_info_str = f"E{episode[0]:02d}"
-        else: episode_info_str = f"E{episode:02d}"
-    
-    year_from_filename = parsed_info.get('year')
-    
-    # --- DECREED MODIFICATION: START ---
-    # Hybrid language detection using PTN's output and our custom map.
-    found_languages = set()
-    search_string_lower = name.lower()
-    
-    # Also check PTN's audio tag for languages
-    ptn_audio_tags = parsed_info.get('audio', '')
-    if isinstance(ptn_audio_tags, list):
-        ptn_audio_tags = " ".join(ptn_audio_tags)
-    
-    search_string_lower += " " + ptn_audio_tags.lower()
-    
-    for key, value in LANGUAGE_MAP.items():
-        if re.search(r'\b' + key + r'\b', search_string_lower):
-            found_languages.add(value)
-    # --- DECREED MODIFICATION: END ---
-
-    title_to_clean = initial_title
-    if year_from_filename:
-        title_to_clean = re.sub(r'\b' + str(year_from_filename) + r'\b', '', title_to_clean)
-    
-    if raw_episode_text_to_remove:
-        title_to_clean = title_to_clean.replace(raw_episode_text_to_remove, '')
-        
-    title_to_clean = re.sub(r'\bS\d{1,2}\b|\bE\d{1,4}\b', '', title_to_clean, flags=re.IGNORECASE)
-    
-    junk_words = [
-        'Ep', 'Eps', 'Episode', 'Episodes', 'Season', 'Series', 'South', 'Dubbed', 'Completed',
-        'Web', r'\d+Kbps', 'UNCUT', 'ORG', 'HQ', 'ESubs', 'MSubs', 'REMASTERED', 'REPACK',
-        'PROPER', 'iNTERNAL', 'Sample', 'Video', 'Dual', 'Audio', 'Multi', 'Hollywood',
-        'New', 'Combined', 'Complete', 'Chapter', 'PSA', 'JC', 'DIDAR', 'StarBoy',
-        'Hindi', 'English', 'Tamil', 'Telugu', 'Kannada', 'Malayalam', 'Punjabi', 'Japanese', 'Korean',
-        'NF', 'AMZN', 'MAX', 'DSNP', 'ZEE5', 'WEB-DL', 'HDRip', 'WEBRip', 'HEVC', 'x265', 'x264', 'AAC',
-        '1tamilmv', 'www'
-    ]
-    junk_pattern_re = r'\b(' + r'|'.join(junk_words) + r')\b'
-    cleaned_title = re.sub(junk_pattern_re, '', title_to_clean, flags=re.IGNORECASE)
-    cleaned_title = re.sub(r'[-_.]', ' ', cleaned_title)
-    cleaned_title = re.sub(r'^[^\w\s]+', '', cleaned_title)
-    cleaned_title = re.sub(r'\s+', ' ', cleaned_title).strip()
-    
-    if not cleaned_title: cleaned_title = " ".join(original_name.split('.')[:-1])
+    return (await parse_filenames([name], raise_errors=True))[0]
+
+# Files are sent to the pool in chunks, so one IPC round trip covers many names.
+PARSE_CHUNK_SIZE = 32
+_parser_pool = None
+
+def _get_parser_pool():
+    global _parser_pool
+    if _parser_pool is None and Config.PARSER_PROCESSES != 0:
+        workers = Config.PARSER_PROCESSES if Config.PARSER_PROCESSES > 0 else min(4, os.cpu_count() or 1)
+        # spawn, not fork: the bot process runs threads (Motor, executors) that fork would copy mid-state.
+        _parser_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _parser_pool
+
+def shutdown_parser_pool():
+    global _parser_pool
+    if _parser_pool is not None:
+        _parser_pool.shutdown(wait=False, cancel_futures=True)
+        _parser_pool = None
+
+def _parse_chunk(names):
+    """Runs in a pool process. Returns (result, error) per name so one bad name doesn't sink the chunk."""
+    results = []
+    for name in names:
+        try:
+            results.append((parse_filename_offline(name), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+async def _parse_offline(names):
+    chunks = [names[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(names), PARSE_CHUNK_SIZE)]
+    loop = asyncio.get_running_loop()
+    pool = _get_parser_pool()
+    try:
+        chunk_results = await asyncio.gather(*[loop.run_in_executor(pool, _parse_chunk, chunk) for chunk in chunks])
+    except BrokenProcessPool:
+        logger.error("Filename parser pool died. Recreating it and parsing this batch in a thread.")
+        shutdown_parser_pool()
+        chunk_results = await asyncio.gather(*[loop.run_in_executor(None, _parse_chunk, chunk) for chunk in chunks])
+    return [result for chunk in chunk_results for result in chunk]
+
+async def parse_filenames(names, raise_errors: bool = False):
+    """
+    Parses many filenames at once: the regex/PTN stage runs in the parser process
+    pool in chunks, then the IMDb lookups run concurrently on the event loop.
+    A name that fails to parse yields None (or raises, with raise_errors).
+    """
+    if not names:
+        return []
+    offline_results = await _parse_offline(list(names))
+    for name, (_, error) in zip(names, offline_results):
+        if error:
+            if raise_errors:
+                raise ValueError(f"Could not parse filename '{name}': {error}")
+            logger.error(f"Could not parse filename '{name}': {error}")
+    return await asyncio.gather(*[_complete_or_none(offline) for offline, _ in offline_results])
+
+async def _complete_or_none(offline):
+    return await _complete_parsed_info(offline) if offline else None
+
+async def _complete_parsed_info(offline: dict) -> dict:
+    """Adds the IMDb-verified title and the display fields to the offline parse result."""
+    cleaned_title = offline["cleaned_title"]
+    year_from_filename = offline["year"]
+    season_info_str = offline["season_info"]
+    episode_info_str = offline["episode_info"]
 
     definitive_title, definitive_year = await get_definitive_title_from_imdb(cleaned_title)
 
@@ -254,19 +264,19 @@ async def clean_and_parse_filename(name: str, cache: dict = None):
         "episode_info": episode_info_str,
         # --- DECREED MODIFICATION: START ---
         # Return detected languages. Audio tag is removed from quality_tags to avoid duplication.
-        "languages": sorted(list(found_languages)),
-        "quality_tags": " | ".join(filter(None, [parsed_info.get('resolution'), parsed_info.get('quality'), parsed_info.get('codec')]))
+        "languages": offline["languages"],
+        "quality_tags": offline["quality_tags"]
         # --- DECREED MODIFICATION: END ---
     }
 
-async def create_post(client, user_id, messages, cache: dict):
-    user = await get_user(user_id)
+async def create_post(client, user_id, messages, user: dict = None):
+    if user is None:
+        user = await get_user(user_id)
     if not user: return []
 
     media_info_list = []
     # In the main flow, messages are Pyrogram Message objects
-    parse_tasks = [clean_and_parse_filename(getattr(m, m.media.value, None).file_name, cache) for m in messages if getattr(m, m.media.value, None)]
-    parsed_results = await asyncio.gather(*parse_tasks)
+    parsed_results = await parse_filenames([getattr(m, m.media.value, None).file_name for m in messages if getattr(m, m.media.value, None)])
 
     for i, info in enumerate(parsed_results):
         if info:
@@ -289,8 +299,16 @@ async def create_post(client, user_id, messages, cache: dict):
     
     CAPTION_LIMIT = PHOTO_CAPTION_LIMIT if post_poster else TEXT_MESSAGE_LIMIT
     
+    # --- LEGENDARY CORRECTION: Generate a bot deep link, not a direct file link. ---
+    # This deep link will trigger the 'start' command in handlers/start.py.
+    # All of the post's deep links are shortened together, reusing the loaded user settings.
+    bot_username = client.me.username # client object is passed to create_post
+    deep_links = [f"https://t.me/{bot_username}?start=get_{user_id}_{info['file_unique_id']}" for info in media_info_list]
+    short_links = await shorten_links(deep_links, user_id, user)
+    # --- END LEGENDARY CORRECTION ---
+
     all_link_entries = []
-    for info in media_info_list:
+    for info, link in zip(media_info_list, short_links):
         display_tags_parts = []
         
         if info.get('episode_info'):
@@ -306,19 +324,6 @@ async def create_post(client, user_id, messages, cache: dict):
             display_tags_parts.append(info['quality_tags'])
         
         display_tags = " | ".join(filter(None, display_tags_parts))
-        
-        # --- LEGENDARY CORRECTION: Generate a bot deep link, not a direct file link. ---
-        # This is the correct implementation based on the user's true intent.
-        owner_id = user_id
-        file_unique_id = info['file_unique_id']
-        bot_username = client.me.username # client object is passed to create_post
-        
-        # This deep link will trigger the 'start' command in handlers/start.py
-        deep_link = f"https://t.me/{bot_username}?start=get_{owner_id}_{file_unique_id}"
-        
-        # The deep link is then shortened.
-        link = await get_shortlink(deep_link, owner_id)
-        # --- END LEGENDARY CORRECTION ---
 
         file_size_str = format_bytes(info['file_size'])
         all_link_entries.append(f"├─📁 {display_tags or 'File'}\n│  ╰─➤ [Click Here]({link}) ({file_size_str})")
@@ -0,0 +1,111 @@
+# utils/title_cluster.py
+
+from bisect import bisect_left
+from collections import defaultdict
+from rapidfuzz import fuzz, process
+from thefuzz.utils import full_process
+
+
+class TitleClusterer:
+    """
+    Groups batch titles the same way as
+
+        best = max(keys, key=lambda k: thefuzz.fuzz.token_set_ratio(title, k))
+        if best and thefuzz.fuzz.token_set_ratio(title, best) > threshold: ...
+
+    without scoring every existing key. Only keys that can beat the threshold
+    are scored:
+    - keys sharing a token with the title, found through an inverted index;
+    - keys sharing no token, whose token_set_ratio is then just the ratio of
+      the sorted token strings. These are found with a C-level ratio scan that
+      is limited to keys of a compatible length.
+    Scores are rounded like thefuzz does and ties go to the oldest key, so the
+    resulting groups are identical to the linear scan. Episodes of a series
+    share their title, so the best match per title is remembered and later only
+    checked against keys added since.
+    """
+
+    def __init__(self, threshold: int = 85):
+        self.threshold = threshold
+        # thefuzz rounds before comparing, so anything from threshold + 0.5 up may pass.
+        self.score_cutoff = threshold + 0.5
+        self.keys = []
+        self.processed = []
+        self.positions = {}
+        self.token_index = defaultdict(list)  # token -> positions of keys containing it
+        self.length_buckets = defaultdict(lambda: ([], []))  # len(sorted tokens) -> (strings, positions)
+        self.best_matches = {}  # processed title -> (keys checked, best position, best score)
+
+    @staticmethod
+    def _normalize(title: str):
+        processed = full_process(title, force_ascii=True)
+        tokens = sorted(set(processed.split()))
+        return processed, tokens, " ".join(tokens)
+
+    def add(self, key: str):
+        if key in self.positions:
+            return
+        processed, tokens, sorted_tokens = self._normalize(key)
+        position = len(self.keys)
+        self.keys.append(key)
+        self.processed.append(processed)
+        self.positions[key] = position
+        for token in tokens:
+            self.token_index[token].append(position)
+        strings, positions = self.length_buckets[len(sorted_tokens)]
+        strings.append(sorted_tokens)
+        positions.append(position)
+
+    def _candidates(self, tokens, sorted_tokens: str, start: int):
+        """Positions from `start` on of the keys that might score above the threshold."""
+        # Positions are appended in increasing order, so every list can be cut with bisect.
+        candidates = set()
+        for token in tokens:
+            positions = self.token_index.get(token)
+            if positions:
+                candidates.update(positions[bisect_left(positions, start):])
+
+        # ratio = 2 * matches / (len_a + len_b), so a key can only reach the cutoff
+        # if its length is within this band around the title's length.
+        length = len(sorted_tokens)
+        cutoff = self.score_cutoff / 100
+        low = int(length * cutoff / (2 - cutoff))
+        high = int(length * (2 - cutoff) / cutoff) + 1
+        for bucket_length in range(low, high + 1):
+            bucket = self.length_buckets.get(bucket_length)
+            if not bucket:
+                continue
+            strings, positions = bucket
+            offset = bisect_left(positions, start)
+            for _, _, i in process.extract_iter(sorted_tokens, strings[offset:], scorer=fuzz.ratio, score_cutoff=self.score_cutoff):
+                candidates.add(positions[offset + i])
+        return candidates
+
+    def match(self, title: str):
+        """Returns the existing key the title belongs to, or None if it starts a new group."""
+        processed, tokens, sorted_tokens = self._normalize(title)
+        if not tokens or not self.keys:
+            return None
+
+        start, best_position, best_score = self.best_matches.get(processed, (0, None, -1))
+        candidates = sorted(self._candidates(tokens, sorted_tokens, start))
+        choices = [self.processed[position] for position in candidates]
+        # extract_iter yields in input order, so ties keep going to the oldest key.
+        for _, score, i in process.extract_iter(processed, choices, scorer=fuzz.token_set_ratio, score_cutoff=self.score_cutoff):
+            score = int(round(score))
+            if score > best_score:
+                best_position, best_score = candidates[i], score
+        self.best_matches[processed] = (len(self.keys), best_position, best_score)
+        if best_position is None or best_score <= self.threshold:
+            return None
+        key = self.keys[best_position]
+        # Mirrors the `if best_match_key and ...` guard of the linear scan.
+        return key if key else None
+
+    def assign(self, title: str) -> str:
+        """Returns the key the title is grouped under, starting a new group when nothing matches."""
+        key = self.match(title)
+        if key is None:
+            self.add(title)
+            return title
+        return key